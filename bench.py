@@ -0,0 +1,340 @@
+"""
+Benchmarks of the viewer on synthetic logs, to see how it scales and to
+compare versions.
+
+    python bench.py --sizes 10k,100k,1M --output bench.json
+    python bench.py --sizes 10k,100k,1M --compare bench.json
+
+A log of each size is generated (once, kept in --dir) with a mix of what
+beamline IPython/Sardana sessions write: run_line_magic wrappers, scans
+with large stdout tables, DevError tracebacks, on the spockdoor, secondDoor
+and thirdDoor profiles. The viewer is then run headless with Textual's
+pilot and the stages below are timed, each with the peak memory (RSS,
+including the mapped log) while it ran:
+
+    startup, load             opening the log and loading all entries, no cache
+    startup_cached, load_cached   the same from the index cache
+    strip                     strip_command over raw commands
+    search_scan:<q>           the live search scanning the entries
+    search_index_build        building the trigram index
+    search_indexed:<q>        the live search with the trigram index
+    sort:<column>             sorting all rows, first time and (cached)
+    issue_filter              the "Show issues only" filter
+    build_table               showing all rows and drawing the table
+    stats                     opening the statistics screen on all rows
+
+Run it from the viewer's directory (it reads settings.json like the viewer).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from importlib.metadata import version
+
+from logcache import cache_paths
+from logfilter import Query
+from logstore import INF, strip_command
+
+DOORS = ["spockdoor", "secondDoor", "thirdDoor"]
+SEARCH_QUERIES = ["ascan", "mot12", "no such command"]  # common, selective, no match
+SORT_COLUMNS = ["duration", "start_time", "command"]
+STRIP_SAMPLE = 1_000_000  # at most this many raw commands are stripped
+SLOWER = 1.2  # --compare marks stages taking this much longer as regressions
+SUFFIXES = {"k": 1_000, "M": 1_000_000}
+
+
+def size(value: str) -> int:
+    """Entry count like 10000, 10k or 1M."""
+    try:
+        if value[-1:] in SUFFIXES:
+            return int(float(value[:-1]) * SUFFIXES[value[-1]])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a size: {value!r}")
+
+
+parser = argparse.ArgumentParser(description="Time the viewer on synthetic logs of several sizes")
+parser.add_argument("--sizes", type=lambda s: [size(v) for v in s.split(",")], default=[10_000, 100_000],
+                    help="Comma separated entry counts, e.g. 10k,100k,1M,10M (default: 10k,100k)")
+parser.add_argument("--dir", default=os.path.join(os.environ.get("TMPDIR", "/tmp"), "log_viewer_bench"),
+                    help="Where the generated logs are kept between runs")
+parser.add_argument("--seed", type=int, default=0, help="Seed of the log generator")
+parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parsing processes of the viewer, as its --workers")
+parser.add_argument("--repeat", type=int, default=3, help="Runs of the short stages, the fastest is recorded (default: 3)")
+parser.add_argument("--output", help="Write the results to this JSON file")
+parser.add_argument("--compare", help="Compare with the results in this JSON file (from --output)")
+
+
+# --------- Synthetic logs ---------
+def make_command(rng: random.Random) -> tuple[str, str, float]:
+    """A random command as IPython logs it, with its stdout and duration."""
+    motor = f"mot{rng.randint(1, 40):02d}"
+    roll = rng.random()
+    if roll < 0.30:
+        t = rng.choice([0.1, 0.5, 1, 2])
+        return f"get_ipython().run_line_magic('ct', '{t}')", f"ct {t}\n  ct01 = {rng.random():.6f}\n", t + 0.05
+    if roll < 0.50:
+        return (f"get_ipython().run_line_magic('mv', '{motor} {rng.uniform(-10, 10):.3f}')", "",
+                rng.uniform(0.2, 20))
+    if roll < 0.65:
+        start, points, t = rng.uniform(-5, 0), rng.choice([10, 20, 50, 100, 500]), rng.choice([0.1, 0.5, 1])
+        scan = rng.choice(["ascan", "dscan"])
+        header = f"Operation will be saved in /data/scan_{rng.randint(1, 99999)}.h5\nScan #{rng.randint(1, 9999)} started\n"
+        table = "".join(f"{i:5d} {start + i * 0.01:10.4f} {rng.random():10.6f} {rng.random() * 1e5:12.1f}\n"
+                        for i in range(points + 1))
+        return (f"get_ipython().run_line_magic('{scan}', '{motor} {start:.2f} {start + 5:.2f} {points} {t}')",
+                header + table, points * (t + 0.05))
+    if roll < 0.72:
+        return "get_ipython().run_line_magic('wa', '')", "".join(
+            f"mot{m:02d} {rng.uniform(-10, 10):10.4f}\n" for m in range(1, 41)), 0.8
+    if roll < 0.80:
+        return (f"get_ipython().run_line_magic('senv', 'ScanDir /data/{rng.randint(1, 99)}')", "", 0.05)
+    if roll < 0.85:
+        return "www", "", 0.01
+    if roll < 0.92:
+        return f"print({motor}.position)", f"{rng.uniform(-10, 10)}\n", 0.02
+    return (f"for i in range({rng.randint(2, 20)}):\n    mv({motor}, i)\n    ct(1)", "", rng.uniform(5, 60))
+
+
+def make_entry(rng: random.Random, line: int, start: datetime) -> dict:
+    command, stdout, duration = make_command(rng)
+    error = ""
+    if rng.random() < 0.03:
+        error = ("Traceback (most recent call last):\n  File \"<ipython-input>\", line 1, in <module>\n"
+                 f"PyTango.DevFailed: DevError(desc = '{command[:30]} failed: motor in FAULT state')")
+        stdout += f"An error occurred while running {command[:30]}:\nDevError: motor in FAULT state\n"
+    return {
+        "line": line,
+        "profile": rng.choice(DOORS),
+        "start_time": start.isoformat(),
+        "duration": round(duration * rng.uniform(0.9, 1.3), 3),
+        "command": command,
+        "stdout": stdout,
+        "result": "" if rng.random() < 0.9 else repr(rng.random()),
+        "error": error,
+    }
+
+
+def generate(path: str, count: int, seed: int = 0) -> None:
+    """Write a time-ordered synthetic log of count entries."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 8)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        for line in range(1, count + 1):
+            start += timedelta(seconds=rng.expovariate(1 / 20))
+            f.write(json.dumps(make_entry(rng, line, start)) + "\n")
+    os.replace(tmp_path, path)
+
+
+def synthetic_log(directory: str, count: int, seed: int) -> str:
+    path = os.path.abspath(os.path.join(directory, f"bench_{count}_{seed}.jsonl"))
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        started = time.perf_counter()
+        generate(path, count, seed)
+        print(f"Generated {path} ({os.path.getsize(path) / 2**20:,.0f} MB) in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+# --------- Measuring ---------
+def reset_peak_rss() -> None:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # resets VmHWM
+    except OSError:
+        pass  # not Linux: the peak is the one of the whole run
+
+
+def peak_rss_kb() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Results:
+    def __init__(self, repeat: int = 1) -> None:
+        self.records: list[dict] = []
+        self.repeat = repeat
+
+    def record(self, count: int, stage: str, seconds: float, **extra) -> None:
+        result = {"size": count, "stage": stage, "seconds": round(seconds, 6), "peak_rss_kb": peak_rss_kb(), **extra}
+        self.records.append(result)
+        notes = " ".join(f"{key}={value}" for key, value in extra.items())
+        print(f"{count:>12,} {stage:<32} {seconds:10.4f}s {result['peak_rss_kb'] / 1024:9.1f} MB  {notes}")
+        reset_peak_rss()
+
+    @contextmanager
+    def stage(self, count: int, stage: str, **extra):
+        reset_peak_rss()
+        started = time.perf_counter()
+        yield extra  # the stage may add to the record
+        self.record(count, stage, time.perf_counter() - started, **extra)
+
+    async def best(self, count: int, stage: str, run, **extra) -> None:
+        """Run the coroutine function run self.repeat times and record the fastest run; it may return more to record."""
+        reset_peak_rss()
+        fastest = INF
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            extra.update(await run() or {})
+            fastest = min(fastest, time.perf_counter() - started)
+        self.record(count, stage, fastest, **extra)
+
+
+# --------- Stages ---------
+def bench_strip(results: Results, count: int, seed: int) -> None:
+    rng = random.Random(seed)
+    commands = [make_command(rng)[0] for _ in range(min(count, STRIP_SAMPLE))]
+    with results.stage(count, "strip", entries=len(commands)):
+        for command in commands:
+            strip_command(command)
+
+
+async def wait_for(pilot, condition) -> None:
+    while not condition():
+        await pilot.pause(0.01)
+
+
+async def bench_app(results: Results, count: int, path: str, workers: int, cached: bool) -> None:
+    """Run the viewer on the log, timing the stages. cached: start from the index cache written before."""
+    from textual.widgets import Checkbox
+    from viewer import JsonlInspectorApp, parser as viewer_parser
+
+    if not cached:
+        for cache_path in cache_paths(path):
+            if os.path.exists(cache_path):
+                os.unlink(cache_path)
+    suffix = "_cached" if cached else ""
+    app = JsonlInspectorApp(viewer_parser.parse_args([path, "--workers", str(workers)]))
+    reset_peak_rss()
+    started = time.perf_counter()
+    async with app.run_test(size=(160, 60)) as pilot:
+        await wait_for(pilot, lambda: app.engine.data is not None)  # opened after the first frame
+        results.record(count, "startup" + suffix, time.perf_counter() - started, rows=app.table.row_count)
+        with results.stage(count, "load" + suffix):
+            await wait_for(pilot, lambda: not app.engine.loading)
+        if cached:
+            return
+        # search without the trigram index, then build it
+        app.workers.cancel_group(app, "index")
+        app.engine.search_index = None
+
+        async def search(text: str) -> dict:
+            app.search_query = Query()  # not a refinement of the previous search
+            await app.search(Query(text)).wait()
+            return {"matches": len(app.search_rows)}
+
+        for query in SEARCH_QUERIES:
+            await results.best(count, f"search_scan:{query}", partial(search, query))
+        with results.stage(count, "search_index_build"):
+            await app.build_index().wait()
+        for query in SEARCH_QUERIES:
+            await results.best(count, f"search_indexed:{query}", partial(search, query))
+        await search("")
+
+        async def sort(cached: bool) -> None:
+            if not cached:
+                app.engine.sort_permutations.clear()
+            app.sort_rows(app.filtered_rows)
+
+        for column in SORT_COLUMNS:
+            app.sort_column, app.reverse_sort = column, False
+            await results.best(count, f"sort:{column}", partial(sort, False))
+            await results.best(count, f"sort:{column} (cached)", partial(sort, True))
+        app.sort_column = None
+
+        async def issue_filter() -> dict:
+            app.apply_filters()
+            return {"rows": len(app.filtered_rows)}
+
+        with app.prevent(Checkbox.Changed):
+            app.show_issues_only_checkbox.value = True
+        await results.best(count, "issue_filter", issue_filter)
+        with app.prevent(Checkbox.Changed):
+            app.show_issues_only_checkbox.value = False
+        app.apply_filters()
+
+        async def build_table() -> None:
+            app.build_table(app.filtered_rows)
+            await pilot.pause()  # drawn
+
+        app.table.move_cursor(0)
+        await pilot.pause()
+        await results.best(count, "build_table", build_table, rows=len(app.filtered_rows))
+
+        async def stats() -> None:
+            app.action_show_stats()
+            await pilot.pause()  # drawn
+            app.pop_screen()
+            await pilot.pause()
+
+        await results.best(count, "stats", stats)
+
+
+# --------- Reporting ---------
+def git_version() -> str:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(records: list[dict], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {(r["size"], r["stage"]): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} ({baseline.get('version') or 'unknown version'}):")
+    for record in records:
+        old = before.get((record["size"], record["stage"]))
+        if old is None or not old["seconds"]:
+            continue
+        ratio = record["seconds"] / old["seconds"]
+        memory = record["peak_rss_kb"] / max(old["peak_rss_kb"], 1)
+        mark = "  SLOWER" if ratio >= SLOWER else ""
+        print(f"{record['size']:>12,} {record['stage']:<32} {ratio:6.2f}x time {memory:6.2f}x memory{mark}")
+
+
+def main() -> None:
+    args = parser.parse_args()
+    results = Results(args.repeat)
+    for count in args.sizes:
+        path = synthetic_log(args.dir, count, args.seed)
+        bench_strip(results, count, args.seed)
+        asyncio.run(bench_app(results, count, path, args.workers, cached=False))
+        asyncio.run(bench_app(results, count, path, args.workers, cached=True))
+    report = {
+        "version": git_version(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "textual": version("textual"),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "workers": args.workers,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "results": results.records,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    if args.compare:
+        compare(results.records, args.compare)
+
+
+if __name__ == "__main__":
+    main()
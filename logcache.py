@@ -0,0 +1,210 @@
+"""
+Sidecar cache of a log's index, so reopening a log only parses what was
+appended since it was last opened.
+
+The cache sits next to the log (<log>.lvcache), or under
+~/.cache/log_viewer when the log's directory is not writable. It holds the
+line offsets and the Columns of the indexed entries in binary form, and is
+only used while the log still starts with the bytes it was built from. The
+offsets of a compressed log are into its decompressed contents, so its cache
+is only used while the file is unchanged.
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+from array import array
+
+from logstore import COMPRESSED_SUFFIXES, INF, Columns, LogFile, intern_command
+
+CACHE_VERSION = 3
+CACHE_MAGIC = b"LVCACHE\n"
+CACHE_SUFFIX = ".lvcache"
+USER_CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", "~/.cache"), "log_viewer")
+HASH_BLOCK = 65536  # bytes hashed at the start and before the end of the cached part
+
+
+def cache_paths(log_path: str) -> list[str]:
+    """Candidate cache locations for a log, preferred first."""
+    log_path = os.path.abspath(os.path.expanduser(log_path))
+    key = hashlib.sha1(log_path.encode()).hexdigest()
+    return [
+        log_path + CACHE_SUFFIX,
+        os.path.join(os.path.expanduser(USER_CACHE_DIR), key + CACHE_SUFFIX),
+    ]
+
+
+def prefix_hash(log_path: str, end: int) -> str:
+    """Hash of the first and the last block of the first end bytes of the log."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(log_path, "rb") as f:
+        digest.update(f.read(min(end, HASH_BLOCK)))
+        tail = max(end - HASH_BLOCK, HASH_BLOCK)
+        if end > tail:
+            f.seek(tail)
+            digest.update(f.read(end - tail))
+    return digest.hexdigest()
+
+
+def _join(strings: list[str]) -> bytes:
+    joined = "\0".join(strings)
+    if joined.count("\0") != max(len(strings) - 1, 0):
+        joined = "\0".join(s.replace("\0", "\ufffd") for s in strings)
+    return joined.encode("utf-8", "surrogatepass")
+
+
+def _split(blob: bytes, count: int) -> list[str]:
+    if not count:
+        return []
+    strings = blob.decode("utf-8", "surrogatepass").split("\0")
+    if len(strings) != count:
+        raise ValueError("string column does not match the entry count")
+    return strings
+
+
+def _read_array(f, typecode: str, count: int) -> array:
+    values = array(typecode)
+    values.fromfile(f, count)
+    return values
+
+
+def _read(cache_path: str, log_path: str, rules: str) -> tuple[array, int, Columns] | None:
+    with open(cache_path, "rb") as f:
+        if f.readline() != CACHE_MAGIC:
+            return None
+        header = json.loads(f.readline())
+        if (header["version"] != CACHE_VERSION
+                or header["byteorder"] != sys.byteorder
+                or header["path"] != os.path.abspath(log_path)
+                or header["rules"] != rules):
+            return None
+        stat = os.stat(log_path)
+        end = header["end"]
+        unchanged = stat.st_size == header["size"] and stat.st_mtime_ns == header["mtime"]
+        if log_path.endswith(COMPRESSED_SUFFIXES):
+            if not unchanged:
+                return None
+        elif stat.st_size < end:
+            return None
+        elif not unchanged and prefix_hash(log_path, end) != header["prefix_hash"]:
+            return None  # rewritten, not just appended to
+        count = header["count"]
+        offsets = _read_array(f, "Q", count)
+        columns = Columns()
+        columns.line = _read_array(f, "q", count)
+        columns.start = _read_array(f, "d", count)
+        columns.duration = _read_array(f, "d", count)
+        columns.flags = bytearray(f.read(count))
+        if len(columns.flags) != count:
+            raise EOFError("flags column is truncated")
+        columns.profile = [sys.intern(p) for p in _split(f.read(header["profile_bytes"]), count)]
+        columns.command = [intern_command(command) for command in _split(f.read(header["command_bytes"]), count)]
+        columns.time_sorted = header["time_sorted"]
+    return offsets, end, columns
+
+
+def _time_bounds(start: array) -> list[float] | None:
+    low = min((t for t in start if t == t), default=None)
+    return None if low is None else [low, max(t for t in start if t == t)]
+
+
+def cached_time_range(log_path: str) -> tuple[float, float] | None:
+    """
+    Earliest and latest start time in a log according to its cache, (INF,
+    -INF) if no entry has one. None if there is no cache of the whole,
+    unchanged log. Only reads the cache header.
+    """
+    log_path = os.path.abspath(os.path.expanduser(log_path))
+    for cache_path in cache_paths(log_path):
+        try:
+            with open(cache_path, "rb") as f:
+                if f.readline() != CACHE_MAGIC:
+                    continue
+                header = json.loads(f.readline())
+            stat = os.stat(log_path)
+        except (OSError, ValueError):
+            continue
+        if (header.get("version") == CACHE_VERSION
+                and header.get("path") == log_path
+                and header.get("size") == stat.st_size
+                and header.get("mtime") == stat.st_mtime_ns
+                and header.get("complete")
+                and "time_bounds" in header):
+            return tuple(header["time_bounds"] or (INF, -INF))
+    return None
+
+
+def load_cache(log_path: str, rules: str) -> tuple[array, int, Columns] | None:
+    """
+    Return the cached (offsets, end, columns) of a log, or None if there is
+    no usable cache. The log only needs to be indexed from end onwards.
+    rules is the fingerprint of the Classifier the flags must come from.
+    """
+    log_path = os.path.abspath(os.path.expanduser(log_path))
+    for cache_path in cache_paths(log_path):
+        try:
+            cached = _read(cache_path, log_path, rules)
+        except FileNotFoundError:
+            continue
+        except (OSError, EOFError, ValueError, KeyError) as e:
+            logging.debug("Ignoring unreadable cache %s: %s", cache_path, e)
+            continue
+        if cached is not None:
+            return cached
+    return None
+
+
+def save_cache(log: LogFile, columns: Columns, rules: str, count: int | None = None) -> str | None:
+    """
+    Write the index of the first count entries (default: all in columns) of
+    a log, classified by the rules with the given fingerprint. Returns the
+    path written, None if no location was writable.
+    """
+    count = len(columns) if count is None else count
+    end = log.offsets[count] if count < len(log.offsets) else log.end
+    log_path = os.path.abspath(log.path)
+    stat = os.stat(log_path)
+    profiles = _join(columns.profile[:count])
+    commands = _join(columns.command[:count])
+    header = {
+        "version": CACHE_VERSION,
+        "byteorder": sys.byteorder,
+        "path": log_path,
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "prefix_hash": "" if log.compressed else prefix_hash(log_path, end),
+        "end": end,
+        "count": count,
+        "time_sorted": columns.time_sorted,
+        # earliest and latest start time, to skip the log when it is outside a time window
+        "complete": count == len(log),
+        "time_bounds": _time_bounds(columns.start[:count]),
+        "rules": rules,
+        "profile_bytes": len(profiles),
+        "command_bytes": len(commands),
+    }
+    for cache_path in cache_paths(log_path):
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(CACHE_MAGIC)
+                f.write(json.dumps(header).encode() + b"\n")
+                log.offsets[:count].tofile(f)
+                columns.line[:count].tofile(f)
+                columns.start[:count].tofile(f)
+                columns.duration[:count].tofile(f)
+                f.write(columns.flags[:count])
+                f.write(profiles)
+                f.write(commands)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logging.debug("Cannot write cache %s: %s", cache_path, e)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            continue
+        return cache_path
+    return None
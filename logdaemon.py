@@ -0,0 +1,514 @@
+"""
+A local daemon that owns the index of a log for any number of viewers: the
+columns, the search index, the sort orders and the follow-mode tail are
+kept once per log instead of once per viewer.
+
+    python logdaemon.py /data/history/           # serve the logs
+    python viewer.py /data/history/ --daemon     # attach, starting a daemon if none serves them
+
+Viewers attach over a Unix domain socket, by default one per set of logs
+and highlight rules in $XDG_RUNTIME_DIR/log_viewer (or /tmp/log_viewer-<uid>),
+and ask for the rows of a view a window at a time, and for the entries they
+show in detail. The protocol is one JSON object per line each way:
+
+    {"op": "info"}
+        -> {"loading": false, "count": 202000, "generation": 1, "paths": [...], "search_stdout": false}
+    {"op": "rows", "query": "ct 1 -www", "issues_only": false, "after": null, "before": null,
+     "sort": "duration", "reverse": true, "offset": 0, "limit": 100}
+        -> {"count": 202000, "generation": 1, "total": 1320, "rows": [[index, line, profile, start, duration, command, flags], ...]}
+    {"op": "locate", <the view as for rows>, "index": 1234}  or  "time": 1748772000.0
+        -> {"position": 17}
+    {"op": "entry", "index": 1234}
+        -> {"entry": {...}}
+
+Anything else, or a query that does not parse, is answered with {"error": "..."}.
+Views are computed once and kept for the next windows and the other
+viewers. Entries appended to the log are added to the views, at the end
+or where their sort order puts them; generation changes when the log was truncated or rotated and everything
+was indexed again.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import stat
+import subprocess
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from logengine import LogEngine, load_classifier
+from logfilter import FlagTerm, Query, TimeTerm
+from logset import expand_sources
+from logstore import INF, Classifier, FileWatcher
+
+FOLLOW_INTERVAL = 1.0  # max. seconds between file checks (without inotify events)
+IDLE_CHECK = 5.0  # seconds between checks whether the daemon has been idle long enough to exit
+VIEW_CACHE = 16  # views (filtered, sorted rows) kept for further windows
+MAX_ROWS = 1000  # rows per window at most
+CONNECT_TIMEOUT = 10.0  # seconds a viewer waits for a daemon it started to listen
+SORT_COLUMNS = ("line", "start_time", "duration", "command")
+
+
+class DaemonError(Exception):
+    pass
+
+
+def socket_path(sources: list[str], rules: str = "") -> str:
+    """
+    The default socket of the daemon serving a set of logs, classified by
+    the highlight rules with the fingerprint rules (Classifier.fingerprint):
+    viewers with other rules get a daemon of their own.
+    """
+    key = hashlib.sha1("\n".join([*expand_sources(sources), rules]).encode()).hexdigest()[:16]
+    return os.path.join(socket_directory(), key + ".sock")
+
+
+def socket_directory() -> str:
+    """The directory of the default sockets, private to the user."""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    return os.path.join(runtime, "log_viewer") if runtime else f"/tmp/log_viewer-{os.getuid()}"
+
+
+def check_directory(directory: str) -> None:
+    """
+    Refuse a socket directory that is not the user's own with mode 0700: in
+    /tmp another user could have made it first, or made it a symlink, and
+    listen on its sockets.
+    """
+    info = os.lstat(directory)
+    if (not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid()
+            or stat.S_IMODE(info.st_mode) != 0o700):
+        raise DaemonError(f"{directory} is not a directory of this user with mode 0700, not using it")
+
+
+def _number(value: float) -> float | None:
+    return value if value == value else None  # NaN is not JSON
+
+
+class View:
+    __slots__ = ("query", "sort", "reverse", "rows", "count", "lock")
+
+    def __init__(self, query: Query, sort: str | None, reverse: bool) -> None:
+        self.query = query
+        self.sort = sort
+        self.reverse = reverse
+        self.rows: array | list | None = None  # entry indices in display order, None for all of them in order
+        self.count = 0  # entries the rows were computed over
+        self.lock = asyncio.Lock()  # held while the rows are computed in a thread
+
+    def __len__(self) -> int:
+        return self.count if self.rows is None else len(self.rows)
+
+    def __getitem__(self, position: int) -> int:
+        return position if self.rows is None else self.rows[position]
+
+
+class LogIndex:
+    """
+    The engine of a set of logs, fully loaded, and the views of it the
+    viewers asked for.
+    """
+
+    def __init__(self, sources: list[str], classifier: Classifier, use_cache: bool = True, workers: int = 1,
+                 search_stdout: bool = False) -> None:
+        self.sources = sources
+        self.classifier = classifier
+        self.use_cache = use_cache
+        self.workers = workers
+        self.search_stdout = search_stdout
+        self.engine: LogEngine | None = None
+        self.generation = 0
+        self.views: OrderedDict[tuple, View] = OrderedDict()
+
+    @property
+    def loading(self) -> bool:
+        return self.engine is None
+
+    def build(self) -> LogEngine:
+        """
+        Open and parse the logs, update their caches and build the search
+        index; for install(). Runs in a thread, the views stay on the
+        current engine meanwhile.
+        """
+        started = time.monotonic()
+        engine = LogEngine(self.sources, self.classifier, use_cache=self.use_cache, workers=self.workers,
+                           search_stdout=self.search_stdout).load()
+        for path in engine.save_cache():
+            logging.debug("Saved index cache %s", path)
+        engine.build_index()
+        logging.info("Indexed %s entries of %s logs in %.1fs", len(engine), len(engine.data.paths), time.monotonic() - started)
+        return engine
+
+    def install(self, engine: LogEngine) -> None:
+        self.unload()
+        self.engine = engine
+        self.generation += 1
+
+    def unload(self) -> None:
+        """Serve nothing (loading) until the next install()."""
+        if self.engine is not None:
+            self.engine.close()
+            self.engine = None
+            self.views.clear()
+            self.generation += 1
+
+    def refresh(self) -> bool:
+        """
+        Add the entries appended to the newest log. Returns True when it was
+        truncated or rotated and has to be loaded again: the engine reopened
+        its logs, so its columns are not theirs any more and the index is
+        unloaded until then.
+        """
+        new = self.engine.refresh()
+        if new is None:
+            self.unload()
+            return True
+        if new:
+            logging.debug("Appended %s entries", len(new))
+        return False
+
+    def view(self, request: dict, update: bool = True) -> View:
+        """
+        The rows of the view a request asks for, computed once and extended
+        by appended entries; without update possibly not up to date, see
+        stale().
+        """
+        sort = request.get("sort")
+        if sort is not None and sort not in SORT_COLUMNS:
+            raise ValueError(f"cannot sort by {sort!r}")
+        after, before = request.get("after"), request.get("before")
+        key = (request.get("query", ""), bool(request.get("issues_only")), after, before, sort,
+               bool(request.get("reverse")))
+        view = self.views.get(key)
+        if view is None:
+            terms = []
+            if after is not None or before is not None:
+                terms.append(TimeTerm(-INF if after is None else after, INF if before is None else before))
+            if request.get("issues_only"):
+                terms.append(FlagTerm("issue"))
+            view = View(Query(key[0], self.search_stdout, terms), sort, key[5])
+            self.views[key] = view
+            while len(self.views) > VIEW_CACHE:
+                self.views.popitem(last=False)
+        self.views.move_to_end(key)
+        if update and self.stale(view):
+            self.update_view(view)
+        return view
+
+    def stale(self, view: View) -> bool:
+        return view.count < len(self.engine)
+
+    def update_view(self, view: View) -> None:
+        engine = self.engine
+        if view.count == 0:
+            candidates = engine.candidates(view.query)
+            rows = engine.filter(view.query, range(len(engine)) if candidates is None else candidates)
+            if view.sort is not None:
+                view.rows = engine.sort(rows, view.sort, view.reverse)
+            elif view.query or view.reverse:
+                view.rows = array("Q", reversed(rows) if view.reverse else rows)
+        else:
+            rows = engine.filter(view.query, range(view.count, len(engine)))
+            if view.sort is not None:
+                # merged in where sort() puts them, as in the viewer
+                engine.insort(view.rows, rows, view.sort, view.reverse)
+            else:
+                # appended entries come last, as in the viewer
+                if view.rows is None and len(rows) < len(engine) - view.count:
+                    view.rows = array("Q", range(view.count))
+                if view.rows is not None:
+                    view.rows.extend(rows)
+        view.count = len(engine)
+
+    def rows(self, request: dict) -> dict:
+        view = self.view(request)
+        offset = max(int(request.get("offset", 0)), 0)
+        limit = min(int(request.get("limit", 100)), MAX_ROWS)
+        columns = self.engine.columns
+        rows = []
+        for position in range(offset, min(offset + limit, len(view))):
+            i = view[position]
+            rows.append([i, columns.line[i], columns.profile[i], _number(columns.start[i]),
+                         _number(columns.duration[i]), columns.command[i], columns.flags[i]])
+        return {"total": len(view), "rows": rows}
+
+    def locate(self, request: dict) -> dict:
+        """
+        The position in a view of an entry ("index"), or of the first entry
+        starting at a time ("time"); the nearest row if it is not shown.
+        """
+        view = self.view(request)
+        if not len(view):
+            return {"position": 0}
+        if "time" in request:
+            in_order = view.sort is None and not view.reverse
+            return {"position": self.engine.locate_time(view, float(request["time"]), in_order=in_order)}
+        index = int(request["index"])
+        if view.sort is None and not view.reverse:
+            position = bisect_left(view, index) if view.rows is not None else index
+        else:
+            try:
+                position = view.rows.index(index)
+            except ValueError:
+                position = 0
+        return {"position": max(0, min(position, len(view) - 1))}
+
+    def dispatch(self, request: dict) -> dict:
+        """The response to a request, computing the view it asks for if needed."""
+        op = request.get("op")
+        if op == "info":
+            response = {"loading": self.loading, "paths": [] if self.loading else self.engine.data.paths,
+                        "search_stdout": self.search_stdout}
+        elif self.loading:
+            response = {"total": 0, "rows": [], "position": 0, "entry": {}}
+        elif op == "rows":
+            response = self.rows(request)
+        elif op == "locate":
+            response = self.locate(request)
+        elif op == "entry":
+            index = int(request["index"])
+            if not 0 <= index < len(self.engine):
+                raise IndexError(f"no entry {index}")
+            response = {"entry": self.engine[index]}
+        else:
+            raise ValueError(f"unknown op {op!r}")
+        response["count"] = 0 if self.loading else len(self.engine)
+        response["generation"] = self.generation
+        return response
+
+
+class IndexServer:
+    """Serves a LogIndex on a Unix socket, and follows the newest log."""
+
+    def __init__(self, index: LogIndex, path: str, idle_timeout: float = 0) -> None:
+        self.index = index
+        self.path = path
+        self.idle_timeout = idle_timeout  # seconds without viewers after which to exit, 0 for never
+        self.clients = 0
+        self.idle_since = time.monotonic()
+        self.computing = 0  # views being computed in threads; the engine must not change meanwhile
+        self.computed = asyncio.Event()  # set when the last of them is done
+
+    async def dispatch(self, request: dict) -> dict:
+        """
+        LogIndex.dispatch, with the views computed and searched in a thread,
+        so a slow query does not hold up the other viewers.
+        """
+        index = self.index
+        op = request.get("op")
+        if op in ("rows", "locate") and not index.loading:
+            view = index.view(request, update=False)
+            self.computing += 1
+            try:
+                async with view.lock:  # viewers asking for the same view wait for one computation
+                    if op == "locate":
+                        # scans the rows of a sorted view
+                        return await asyncio.to_thread(index.dispatch, request)
+                    if index.stale(view):
+                        await asyncio.to_thread(index.update_view, view)
+            finally:
+                self.computing -= 1
+                if not self.computing:
+                    self.computed.set()
+        return index.dispatch(request)
+
+    async def quiet(self) -> None:
+        """Wait until no view is computed."""
+        while self.computing:
+            self.computed.clear()
+            await self.computed.wait()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.clients += 1
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.dispatch(json.loads(line))
+                except (ValueError, KeyError, TypeError, IndexError, AttributeError) as e:  # QueryError is a ValueError
+                    response = {"error": str(e)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            self.idle_since = time.monotonic()
+            writer.close()
+
+    async def follow(self) -> None:
+        path = self.index.engine.data.path
+        watcher = FileWatcher(path)
+        try:
+            while True:
+                await asyncio.to_thread(watcher.wait, FOLLOW_INTERVAL)
+                await self.quiet()
+                if self.index.refresh():
+                    logging.info("%s was truncated or replaced, indexing again", path)
+                    self.index.install(await asyncio.to_thread(self.index.build))
+        finally:
+            watcher.close()
+
+    def claim_socket(self) -> None:
+        """Remove the socket a daemon that is gone left behind; fail if another one is listening."""
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if directory == socket_directory():
+            check_directory(directory)  # the permissions of a --socket elsewhere are the user's choice
+        try:
+            with socket.socket(socket.AF_UNIX) as probe:
+                probe.connect(self.path)
+        except FileNotFoundError:
+            return
+        except ConnectionRefusedError:
+            os.unlink(self.path)
+            return
+        raise DaemonError(f"another daemon is listening on {self.path}")
+
+    async def serve(self) -> None:
+        self.claim_socket()
+        server = await asyncio.start_unix_server(self.handle, self.path)
+        logging.info("Listening on %s", self.path)
+        try:
+            self.index.install(await asyncio.to_thread(self.index.build))
+            follow = asyncio.create_task(self.follow())
+            while not follow.done():
+                await asyncio.sleep(IDLE_CHECK)
+                if self.idle_timeout and not self.clients and time.monotonic() - self.idle_since > self.idle_timeout:
+                    logging.info("No viewers, exiting")
+                    follow.cancel()
+                    break
+            if not follow.cancelled() and follow.done():
+                follow.result()  # raise what stopped it
+        finally:
+            server.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class DaemonClient:
+    """
+    A viewer's connection to a daemon. Requests block until the daemon
+    answers, so a viewer makes them from threads; they take turns on the
+    socket. Reads entries like a LogSet, len() is the number of entries the
+    daemon had at the last request.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.count = 0
+        self.generation = 0
+        self.socket = socket.socket(socket.AF_UNIX)
+        try:
+            self.socket.connect(path)
+        except OSError:
+            self.socket.close()
+            raise
+        self.file = self.socket.makefile("rb")
+        self.lock = threading.Lock()
+
+    def request(self, op: str, **fields) -> dict:
+        fields["op"] = op
+        with self.lock:
+            self.socket.sendall(json.dumps(fields).encode() + b"\n")
+            line = self.file.readline()
+        if not line:
+            raise DaemonError(f"the daemon on {self.path} went away")
+        response = json.loads(line)
+        if "error" in response:
+            raise DaemonError(response["error"])
+        self.count, self.generation = response["count"], response["generation"]
+        return response
+
+    def __len__(self) -> int:
+        return self.count
+
+    def read(self, index: int) -> dict:
+        return self.request("entry", index=index)["entry"]
+
+    __getitem__ = read
+
+    def close(self) -> None:
+        self.file.close()
+        self.socket.close()
+
+
+def connect(sources: list[str], path: str | None = None, start: bool = True, options: list[str] = (),
+            rules: str = "") -> DaemonClient:
+    """
+    Attach to the daemon serving a set of logs with the highlight rules of
+    fingerprint rules. With start, a daemon is started (with the further
+    command line options, which have to give it these rules) if none is
+    listening; it exits after ten minutes without viewers.
+    """
+    if path is None:
+        path = socket_path(sources, rules)
+        try:
+            check_directory(os.path.dirname(path))
+        except FileNotFoundError:
+            pass  # made by the daemon started below
+    try:
+        return DaemonClient(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        if not start:
+            raise
+    command = [sys.executable, os.path.abspath(__file__), *expand_sources(sources), "--socket", path,
+               "--idle-timeout", "600", *options]
+    logging.debug("Starting %s", " ".join(command))
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            return DaemonClient(path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if process.poll() is not None:
+                raise DaemonError(f"the daemon exited with status {process.returncode}, see logdaemon.py --help")
+            if time.monotonic() > deadline:
+                raise DaemonError(f"no daemon listening on {path} after {CONNECT_TIMEOUT:.0f}s")
+            time.sleep(0.05)
+
+
+parser = argparse.ArgumentParser(description="Serve the index of JSONL logs to viewers started with --daemon")
+parser.add_argument("logfile", nargs="+", help="JSON Lines log files, glob patterns or directories; .gz and .zst files are decompressed")
+parser.add_argument("--socket", help="Unix socket to listen on (default: one per set of logs and highlight rules under $XDG_RUNTIME_DIR/log_viewer)")
+parser.add_argument("--no-cache", action="store_true", help="Do not read or write the index cache next to the log files")
+parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of processes parsing large logs on startup")
+parser.add_argument("--search-stdout", action="store_true", help="Let the search match the stdout of the commands as well")
+parser.add_argument("--idle-timeout", type=float, default=0, help="Exit after this many seconds without viewers (default: never)")
+parser.add_argument("--settings", default="settings.json", help="Settings file with the highlight rules (default: settings.json)")
+parser.add_argument("--debug", action="store_true", help="Log debug messages")
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO,
+                        format=f"%(asctime)s {parser.prog}: %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+    try:
+        classifier = load_classifier(args.settings)
+    except ValueError as e:  # not JSON, or a highlight rule that is not valid
+        parser.error(f"{args.settings}: {e}")
+    index = LogIndex(args.logfile, classifier, use_cache=not args.no_cache,
+                     workers=args.workers, search_stdout=args.search_stdout)
+    server = IndexServer(index, args.socket or socket_path(args.logfile, classifier.fingerprint),
+                         idle_timeout=args.idle_timeout)
+    try:
+        asyncio.run(server.serve())
+    except (DaemonError, FileNotFoundError) as e:
+        logging.error(e)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
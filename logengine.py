@@ -0,0 +1,355 @@
+"""
+The log engine of the viewer without its user interface: opening a set of
+logs, parsing, normalizing and classifying their entries into Columns, and
+searching, filtering, sorting and collapsing them. Neither Textual nor Rich
+is imported, so it can be used from scripts and notebooks:
+
+    from logengine import LogEngine, load_classifier
+
+    engine = LogEngine(["/data/history/"], load_classifier("settings.json")).load()
+    rows = engine.sort(engine.search("ct duration>30"), "duration", reverse=True)
+    for i in rows[:10]:
+        print(engine.columns.command[i], engine.columns.duration[i])
+
+The viewer (viewer.py) and the index daemon (logdaemon.py) are built on it.
+"""
+import contextlib
+import json
+import sys
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Future
+from typing import Iterator, Sequence
+
+import perf
+from logfilter import Query, order_rows, sort_key, sort_permutation, sort_values
+from logset import LogSet
+from logstore import INF, Classifier, Columns, TrigramIndex, search_text
+
+LOAD_CHUNK = 500  # entries parsed per batch in the engine's process
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024  # parse in worker processes when at least this much is not cached
+PARALLEL_CHUNK = 20000  # entries parsed per worker process task
+
+
+def process_pool(workers: int):
+    """
+    A ProcessPoolExecutor whose processes a fork server starts: the viewer
+    and the daemon parse in a thread, and forking it would copy the locks
+    their other threads hold.
+    """
+    import multiprocessing  # only needed for large logs
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import resource_tracker
+    # the resource tracker process gets stderr, which a Textual app replaces by an object without a file
+    with contextlib.redirect_stderr(sys.__stderr__):
+        resource_tracker.ensure_running()
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["logstore"])
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def load_settings(path: str = "settings.json") -> dict:
+    """The settings file of the viewer, {} if there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def load_classifier(settings_path: str = "settings.json") -> Classifier:
+    """The viewer's classifier, from the highlight rules of the settings file if there is one."""
+    return Classifier(load_settings(settings_path).get("highlight_rules"))
+
+
+class LogEngine:
+    """
+    The entries of a set of logs as Columns, and the search index and sort
+    orders built over them. Entries that are not in the index caches are
+    parsed newest first, in batches, so a viewer can show them as they
+    arrive; load() parses them all at once.
+    """
+
+    def __init__(self, sources: list[str], classifier: Classifier | None = None, use_cache: bool = True,
+                 workers: int = 1, max_lines: int = 0, at: float | None = None, search_stdout: bool = False) -> None:
+        self.sources = sources
+        self.classifier = classifier or Classifier()
+        self.use_cache = use_cache
+        self.workers = workers  # processes parsing large logs
+        self.max_lines = max_lines  # only the last max_lines entries of each log (0 = all)
+        self.at = at  # open a single log around this time only, see LogSet
+        self.search_stdout = search_stdout  # index the stdout of the entries for the search as well
+        self.data: LogSet | None = None
+        self.columns = Columns()
+        # entries load_start..load_next-1 are not in self.columns yet, they are loaded newest first
+        self.load_start = self.load_next = 0
+        self.search_index: TrigramIndex | None = None
+        self.sort_permutations: dict[str, list[int]] = {}  # column name -> entries in ascending order
+
+    def __len__(self) -> int:
+        return 0 if self.data is None else len(self.data)
+
+    @property
+    def loading(self) -> bool:
+        """Whether some entries are not parsed yet."""
+        return self.load_next > self.load_start
+
+    def open_logs(self) -> LogSet:
+        """
+        Open the logs: index their line offsets and read their index caches.
+        The engine does not change, so this can run in another thread, for
+        open().
+        """
+        return LogSet(self.sources, self.classifier, use_cache=self.use_cache, max_lines=self.max_lines, at=self.at)
+
+    def open(self, data: LogSet | None = None) -> None:
+        """
+        Use the logs opened by open_logs(), by default opening them now.
+        The entries the caches do not have are parsed by load() or
+        parse_batches().
+        """
+        if data is None:
+            data = self.open_logs()
+        if self.data is not None:
+            self.data.close()
+        self.data = data
+        self.reset()
+
+    def close(self) -> None:
+        if self.data is not None:
+            self.data.close()
+
+    def reset(self) -> None:
+        """Start over with the entries of self.data, after it was opened again or moved."""
+        self.columns = self.data.cached_columns()
+        self.load_start, self.load_next = len(self.columns), len(self.data)
+        self.columns.grow(len(self.data) - len(self.columns))
+        self.search_index = None
+        self.sort_permutations.clear()
+
+    def __getitem__(self, index: int) -> dict:
+        """The normalized entry, read from its log; recently viewed ones are cached."""
+        return self.data[index]
+
+    def read(self, index: int) -> dict:
+        """The normalized entry, read from its log without caching it, for scans over many entries."""
+        return self.data.read(index)
+
+    def loaded_rows(self) -> list[int]:
+        """Indices of the entries that are in self.columns."""
+        return list(range(self.load_start)) + list(range(self.load_next, len(self)))
+
+    def parse_batches(self) -> Iterator[tuple[int, Columns | Future]]:
+        """
+        Parse the entries that are not loaded yet in batches, the newest
+        batch first, for add_batch(). Yields (index of the first entry,
+        Columns); when much is left to parse, the batches are parsed by a
+        pool of worker processes and a Future of the Columns is yielded.
+        """
+        data, lo, hi = self.data, self.load_start, self.load_next
+        if hi <= lo:
+            return
+        if self.workers > 1 and data.parallel_bytes(lo, hi) >= PARALLEL_MIN_BYTES:
+            ranges = list(data.chunks(lo, hi, PARALLEL_CHUNK))
+            pool = process_pool(self.workers)
+            try:
+                futures = [data.submit(pool, start, stop, self.classifier) for start, stop in ranges]
+                for (start, stop), future in zip(ranges, futures):
+                    if future is None:  # cached or compressed
+                        yield from self.parse_here(start, stop)
+                    else:
+                        yield start, future
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+            return
+        yield from self.parse_here(lo, hi)
+
+    def parse_here(self, lo: int, hi: int) -> Iterator[tuple[int, Columns]]:
+        for start, stop in self.data.chunks(lo, hi, LOAD_CHUNK):
+            with perf.Span("parse", stop - start):
+                columns = self.data.parse(start, stop, self.classifier)
+            yield start, columns
+
+    def add_batch(self, start: int, columns: Columns) -> None:
+        """Put a batch from parse_batches() into self.columns."""
+        self.columns.splice(start, columns)
+        self.load_next = start
+
+    def finish_loading(self) -> None:
+        """After the last batch of parse_batches()."""
+        self.load_start = self.load_next
+        self.columns.update_time_sorted()
+
+    def load(self) -> "LogEngine":
+        """Open the logs if they are not open yet and parse all their entries."""
+        if self.data is None:
+            self.open()
+        if self.loading:
+            with perf.Span("load", self.load_next - self.load_start):
+                for start, columns in self.parse_batches():
+                    self.add_batch(start, columns.result() if isinstance(columns, Future) else columns)
+                self.finish_loading()
+        return self
+
+    def save_cache(self) -> list[str]:
+        """Update the index caches with the loaded entries. Returns the paths written."""
+        if not self.use_cache or self.max_lines or self.data is None:
+            return []
+        # while loading, only the entries before the unloaded ones can be cached
+        count = self.load_start if self.loading else len(self.columns)
+        return self.data.save_cache(self.columns, count)
+
+    def refresh(self) -> range | None:
+        """
+        Add the entries appended to the newest log, and return their
+        indices. None when it was truncated or rotated: everything has to
+        be loaded again, from reset() on.
+        """
+        first_new = len(self.data)
+        if self.data.refresh():
+            return None
+        if len(self.data) > first_new:
+            self.append(first_new)
+        return range(first_new, len(self.data))
+
+    def append(self, first_new: int) -> None:
+        """Parse the entries from first_new on, added at the end of self.data."""
+        with perf.Span("parse", len(self.data) - first_new):
+            self.columns.extend(self.data.parse(first_new, len(self.data), self.classifier))
+        if self.search_index is not None:
+            self.index_entries(self.search_index, first_new, len(self.data))
+
+    def prepend(self, count: int) -> None:
+        """
+        Parse the count entries added in front of a log opened at a time.
+        The indices of the entries known so far grow by count, and the
+        search index has to be built again.
+        """
+        with perf.Span("parse", count):
+            columns = self.data.parse(0, count, self.classifier)
+        columns.extend(self.columns)
+        self.columns = columns
+        self.load_start += count
+        self.load_next += count
+        self.sort_permutations.clear()
+        self.search_index = None
+
+    def index_entries(self, index: TrigramIndex, start: int, stop: int) -> None:
+        """Add the loaded entries start..stop to the trigram index."""
+        for i in range(start, stop):
+            if self.search_stdout:
+                text = search_text(self.data.read(i), stdout=True)
+            else:
+                text = self.columns.command[i].lower()
+            index.add(i, text)
+
+    def build_index(self) -> TrigramIndex:
+        """Build the search index over all entries, once they are loaded."""
+        index = TrigramIndex()
+        with perf.Span("index", len(self)):
+            self.index_entries(index, 0, len(self))
+        self.search_index = index
+        return index
+
+    def candidates(self, query: Query) -> list[int] | None:
+        """
+        The entries the search index finds for the text of a query, and
+        those added after it was built; None if there is no index yet or no
+        text to look up.
+        """
+        if self.search_index is None:
+            return None
+        candidates = self.search_index.candidates(query.index_text())
+        if candidates is not None:
+            candidates.extend(range(self.search_index.size, len(self)))
+        return candidates
+
+    def filter(self, query: Query, rows: Sequence[int]) -> list[int]:
+        """The rows (entry indices) matching a query, in their order."""
+        return query.filter(rows, self.columns, self.data.read) if query else list(rows)
+
+    def search(self, query: Query | str, rows: Sequence[int] | None = None) -> list[int]:
+        """The loaded entries, or the given rows, matching a query."""
+        if isinstance(query, str):
+            query = Query(query, search_stdout=self.search_stdout)
+        if rows is None:
+            rows = self.candidates(query)
+            if rows is None:
+                rows = self.loaded_rows()
+        with perf.Span("search", len(rows)):
+            return self.filter(query, rows)
+
+    def sort(self, rows: list[int], column: str, reverse: bool = False) -> list[int]:
+        """
+        Order rows (ascending entry indices) by a column: the cached
+        permutation, masked down to the rows.
+        """
+        with perf.Span("sort", len(rows)):
+            if self.loading:
+                # the columns change with every batch
+                ordered = sorted(rows, key=sort_values(self.columns, column).__getitem__)
+            else:
+                ordered = order_rows(rows, sort_permutation(self.columns, column, self.sort_permutations))
+            if reverse:
+                ordered.reverse()
+        return ordered
+
+    def insort(self, ordered: list[int], rows: Sequence[int], column: str, reverse: bool = False) -> None:
+        """
+        Merge rows added after a sort (entries appended to the log) into
+        ordered, the result of sort(..., column, reverse), where sort() would
+        have put them.
+        """
+        key = sort_key(self.columns, column)
+        with perf.Span("sort", len(rows)):
+            for i in rows:
+                k = key(i)
+                if reverse:
+                    # descending, equal keys newest first: before the first key <= k
+                    lo, hi = 0, len(ordered)
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        if key(ordered[mid]) > k:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                else:
+                    lo = bisect_right(ordered, k, key=key)
+                ordered.insert(lo, i)
+
+    def collapse(self, rows: Sequence[int]) -> tuple[list[int], list[int]]:
+        """
+        The first entry of each run of consecutive rows with the same
+        command, and the length of the runs.
+        """
+        commands = self.columns.command
+        firsts, counts = [], []
+        previous = None
+        with perf.Span("collapse", len(rows)):
+            for i in rows:
+                command = commands[i]
+                # identical commands are interned, mostly one string
+                if command is previous or command == previous:
+                    counts[-1] += 1
+                else:
+                    firsts.append(i)
+                    counts.append(1)
+                    previous = command
+        return firsts, counts
+
+    def locate_time(self, rows: Sequence[int], t: float, in_order: bool = True, runs: bool = False) -> int:
+        """
+        Position in rows of the first entry starting at t or later. When
+        the rows are not in entry order (sorted by a column), of the entry
+        starting nearest to t. With runs the rows are the first entries of
+        runs (see collapse), the run of that entry is found.
+        """
+        starts = self.columns.start
+        if not len(rows):
+            return 0
+        if in_order and self.columns.time_sorted:
+            i = bisect_left(starts, t)
+            position = bisect_right(rows, i) - 1 if runs else bisect_left(rows, i)
+        else:
+            position = min(range(len(rows)),
+                           key=lambda p: abs(starts[rows[p]] - t) if starts[rows[p]] == starts[rows[p]] else INF)
+        return max(0, min(position, len(rows) - 1))
@@ -0,0 +1,339 @@
+"""
+The query language of the viewer's search box, compiled to filters over the
+Columns of the log, and the orders the table can be sorted in.
+
+    ct 1                      the command contains "ct" and "1" (case insensitive)
+    "ct 1"                    the command contains "ct 1"
+    -www                      the command does not contain "www"
+    command:/^u?mv /          the command matches the regular expression
+    stdout:DevError           the stdout contains the text; also result:, error:
+    stdout:/DevError.*motor/
+    profile:2                 door 2, also profile:secondDoor
+    duration>30               also >=, <, <=, = and line>1000
+    time>=2025-06-01T08:00    also time:2025-06-01 (that day)
+    is:issue  is:ascan        flagged by the highlight rules
+
+All terms must match, "-" in front of a term negates it. Regular expressions
+are case sensitive. A query is parsed once; filtering applies the terms one
+after the other to the candidate rows, cheapest first: those on the numeric
+columns, then those on the command column, and last those that need the
+entry read from the log (stdout, result, error), which is read only once for
+all of them.
+"""
+import operator
+import re
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from math import nextafter
+from typing import Callable, Sequence
+
+from logstore import FLAG_BITS, INF, PROFILE_CODES, Columns, parse_time, search_text
+
+# [-][field op]value, the value quoted, a /regex/ or a word; closing quotes and slashes are optional while typing
+TOKEN = re.compile(r'\s*(-)?(?:([A-Za-z_]+)(:|>=|<=|>|<|=))?("(?:[^"\\]|\\.)*"?|/(?:[^/\\]|\\.)*/?|\S+)')
+COMPARISONS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "=": operator.eq,
+               ":": operator.eq}
+TEXT_FIELDS = {"command", "stdout", "result", "error"}
+NUMBER_FIELDS = {"duration", "line"}
+TIME_FIELDS = {"time", "start_time"}
+# length of an ISO timestamp -> the time it spans, for time:2025-06-01
+TIME_PRECISION = {10: timedelta(days=1), 13: timedelta(hours=1), 16: timedelta(minutes=1), 19: timedelta(seconds=1)}
+
+
+class QueryError(ValueError):
+    pass
+
+
+class Term:
+    """
+    One condition of a query. cost 0 terms read the numeric columns, cost 1
+    the command column, cost 2 the entry from the log.
+    """
+    cost = 0
+    negate = False
+
+    def key(self) -> tuple:
+        return type(self), self.negate, self.field, self.op, self.value
+
+    def tester(self, columns: Columns) -> Callable[[int], bool]:
+        """Test of an entry index, for terms of cost 0 and 1."""
+        raise NotImplementedError
+
+    def test_entry(self, entry: dict) -> bool:
+        """Test of an entry read from the log, for terms of cost 2."""
+        raise NotImplementedError
+
+    def narrows(self, other: "Term") -> bool:
+        """Whether every entry matching this term matches other."""
+        return self.key() == other.key()
+
+
+class NumberTerm(Term):
+    def __init__(self, field: str, op: str, value: str) -> None:
+        self.field, self.op = field, op
+        try:
+            self.value = float(value)
+        except ValueError:
+            raise QueryError(f"{field}{op}{value}: not a number")
+        self.compare = COMPARISONS[op]
+
+    def tester(self, columns: Columns) -> Callable[[int], bool]:
+        values, compare, value = getattr(columns, self.field), self.compare, self.value
+        return lambda i: compare(values[i], value)
+
+
+class TimeTerm(Term):
+    """Start time between two bounds, both included."""
+    field = "time"
+
+    def __init__(self, after: float, before: float) -> None:
+        self.op = "between"
+        self.value = (after, before)
+
+    @classmethod
+    def parse(cls, op: str, value: str) -> "TimeTerm":
+        t = parse_time(value)
+        if t != t:
+            raise QueryError(f"time{op}{value}: not an ISO timestamp")
+        if op in (":", "="):
+            span = TIME_PRECISION.get(len(value), timedelta(0))
+            end = (datetime.fromtimestamp(t) + span).timestamp()
+            return cls(t, nextafter(end, -INF) if span else t)
+        return cls(*{">": (nextafter(t, INF), INF), ">=": (t, INF), "<": (-INF, nextafter(t, -INF)),
+                     "<=": (-INF, t)}[op])
+
+    def tester(self, columns: Columns) -> Callable[[int], bool]:
+        start, (after, before) = columns.start, self.value
+        return lambda i: after <= start[i] <= before
+
+    def narrow(self, rows: list[int], columns: Columns) -> list[int]:
+        """The ascending rows inside the bounds, by bisecting time-ordered columns."""
+        lo, hi = columns.time_range(*self.value)
+        return rows[bisect_left(rows, lo):bisect_left(rows, hi)]
+
+
+class ProfileTerm(Term):
+    field, op = "profile", ":"
+
+    def __init__(self, value: str) -> None:
+        self.value = PROFILE_CODES.get(value, value)
+
+    def tester(self, columns: Columns) -> Callable[[int], bool]:
+        profiles, value = columns.profile, self.value
+        return lambda i: profiles[i] == value
+
+
+class FlagTerm(Term):
+    field, op = "is", ":"
+
+    def __init__(self, value: str) -> None:
+        if value not in FLAG_BITS:
+            raise QueryError(f"is:{value}: not one of {', '.join('is:' + flag for flag in FLAG_BITS)}")
+        self.value = value
+        self.bit = FLAG_BITS[value]
+
+    def tester(self, columns: Columns) -> Callable[[int], bool]:
+        flags, bit = columns.flags, self.bit
+        return lambda i: flags[i] & bit != 0
+
+
+class TextTerm(Term):
+    """
+    Text in a field, or matching a regular expression. field None is the
+    search text of the entry: the command, with the stdout if search_stdout.
+    """
+
+    def __init__(self, field: str | None, value: str, search_stdout: bool = False) -> None:
+        self.field, self.search_stdout = field, search_stdout
+        self.op = ":"
+        self.regex = None
+        if len(value) >= 2 and value.startswith("/"):
+            pattern = value[1:]
+            if pattern.endswith("/") and not pattern.endswith("\\/"):
+                pattern = pattern[:-1]
+            try:
+                self.regex = re.compile(pattern.replace("\\/", "/"))
+            except re.error as e:
+                raise QueryError(f"{value}: {e}")
+            self.value = pattern
+        else:
+            self.value = unquote(value).lower()
+        self.cost = 2 if field in ("stdout", "result", "error") or (field is None and search_stdout) else 1
+
+    def key(self) -> tuple:
+        return super().key() + (self.regex is None, self.search_stdout)
+
+    def _text(self, entry: dict) -> str:
+        if self.field is None:
+            if self.regex is None:
+                return search_text(entry, stdout=True)
+            return entry.get("command", "") + "\n" + entry.get("stdout", "")
+        value = entry.get(self.field)
+        return "" if value is None else str(value)
+
+    def tester(self, columns: Columns) -> Callable[[int], bool]:
+        commands = columns.command
+        if self.regex is not None:
+            search = self.regex.search
+            return lambda i: search(commands[i]) is not None
+        value = self.value
+        return lambda i: value in commands[i].lower()
+
+    def test_entry(self, entry: dict) -> bool:
+        text = self._text(entry)
+        if self.regex is not None:
+            return self.regex.search(text) is not None
+        return self.value in (text if self.field is None else text.lower())
+
+    def narrows(self, other: Term) -> bool:
+        # "ct 1" only matches entries that "ct" matches
+        if (isinstance(other, TextTerm) and self.regex is None and other.regex is None
+                and not self.negate and not other.negate
+                and (self.field, self.search_stdout) == (other.field, other.search_stdout)):
+            return other.value in self.value
+        return super().narrows(other)
+
+
+def unquote(value: str) -> str:
+    if not value.startswith('"'):
+        return value
+    value = value[1:-1] if value.endswith('"') and not value.endswith('\\"') and len(value) > 1 else value[1:]
+    return re.sub(r'\\(.)', r'\1', value)
+
+
+def parse_term(token: re.Match, search_stdout: bool) -> Term:
+    negate, field, op, value = token.groups()
+    field = field.lower() if field else None
+    if field not in TEXT_FIELDS:
+        value = unquote(value)
+    if field in NUMBER_FIELDS:
+        term = NumberTerm(field, op, value)
+    elif field in TIME_FIELDS:
+        term = TimeTerm.parse(op, value)
+    elif field == "profile" and op in (":", "="):
+        term = ProfileTerm(value)
+    elif field == "is" and op == ":":
+        term = FlagTerm(value.lower())
+    elif field in TEXT_FIELDS and op == ":":
+        term = TextTerm(field, value, search_stdout)
+    else:
+        # not a field we know: search for the whole token, like "a=1" or "http://"
+        text = token.group(0).strip()[1 if negate else 0:]
+        term = TextTerm(None, text, search_stdout)
+    term.negate = bool(negate)
+    return term
+
+
+def sort_values(columns: Columns, name: str) -> Sequence:
+    """
+    Sort keys of a column ("line", "start_time", "duration" or "command")
+    for all entries; missing times and durations sort last.
+    """
+    if name == "line":
+        return columns.line
+    if name == "command":
+        return columns.command
+    values = columns.start if name == "start_time" else columns.duration
+    return [v if v == v else INF for v in values]
+
+
+def sort_key(columns: Columns, name: str) -> Callable[[int], object]:
+    """The sort key of one entry, like sort_values(columns, name)[i] without building the list."""
+    if name == "line":
+        return columns.line.__getitem__
+    if name == "command":
+        return columns.command.__getitem__
+    values = columns.start if name == "start_time" else columns.duration
+
+    def key(i: int) -> float:
+        v = values[i]
+        return v if v == v else INF
+    return key
+
+
+def sort_permutation(columns: Columns, name: str, cache: dict[str, list[int]]) -> list[int]:
+    """
+    Indices of all entries in ascending order of a column, kept in cache
+    (by column name) until entries are added.
+    """
+    permutation = cache.get(name)
+    if permutation is None or len(permutation) != len(columns):
+        values = sort_values(columns, name)
+        permutation = cache[name] = sorted(range(len(columns)), key=values.__getitem__)
+    return permutation
+
+
+def order_rows(rows: list[int], permutation: list[int]) -> list[int]:
+    """Rows (ascending entry indices) in the order of a permutation of all entries, masked down to them."""
+    if len(rows) == len(permutation):
+        return permutation.copy()  # every entry
+    mask = bytearray(len(permutation))
+    for i in rows:
+        mask[i] = 1
+    return [i for i in permutation if mask[i]]
+
+
+class Query:
+    """
+    A parsed query, or a list of terms. An empty query matches everything.
+    """
+
+    def __init__(self, text: str = "", search_stdout: bool = False, terms: list[Term] | tuple = ()) -> None:
+        self.text = text.strip()
+        terms = list(terms)
+        for token in TOKEN.finditer(self.text):
+            if token.group(4):
+                terms.append(parse_term(token, search_stdout))
+        self.terms = sorted(terms, key=lambda term: term.cost)
+
+    def __bool__(self) -> bool:
+        return bool(self.terms)
+
+    def __repr__(self) -> str:
+        return f"Query({self.text!r})"
+
+    def _testers(self, columns: Columns) -> list[Callable[[int], bool]]:
+        testers = []
+        for term in self.terms:
+            if term.cost < 2:
+                test = term.tester(columns)
+                testers.append((lambda test: lambda i: not test(i))(test) if term.negate else test)
+        return testers
+
+    def _entry_matches(self, entry: dict) -> bool:
+        for term in self.terms:
+            if term.cost == 2 and term.test_entry(entry) == term.negate:
+                return False
+        return True
+
+    def filter(self, rows: list[int], columns: Columns, read: Callable[[int], dict]) -> list[int]:
+        """
+        The rows (ascending entry indices) matching the query. read returns
+        the entry with an index, for the terms that need it.
+        """
+        rows = list(rows)
+        if columns.time_sorted:
+            # a time window on time-ordered columns is a bisect
+            for term in self.terms:
+                if isinstance(term, TimeTerm) and not term.negate:
+                    rows = term.narrow(rows, columns)
+        for test in self._testers(columns):
+            if not rows:
+                return rows
+            rows = [i for i in rows if test(i)]
+        if self.terms and self.terms[-1].cost == 2:
+            rows = [i for i in rows if self._entry_matches(read(i))]
+        return rows
+
+    def refines(self, other: "Query") -> bool:
+        """Whether every entry matching this query matches other, so only other's matches need to be searched."""
+        return all(any(term.narrows(previous) for term in self.terms) for previous in other.terms)
+
+    def index_text(self) -> str:
+        """
+        The longest text that every match contains in its search text, to
+        look up in a TrigramIndex; empty if there is none.
+        """
+        texts = [term.value for term in self.terms
+                 if isinstance(term, TextTerm) and term.field is None and term.regex is None and not term.negate]
+        return max(texts, key=len, default="")
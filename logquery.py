@@ -0,0 +1,149 @@
+"""
+Query JSON Lines logs without the viewer: the entries matching the filters
+are streamed to stdout as JSONL or TSV, in constant memory.
+
+    python logquery.py /data/history --after "2025-06-01 00:00:00" --issues-only
+    python logquery.py 'history.jsonl*' --query 'ascan duration>30' --format tsv | cut -f 5
+
+Entries are normalized, classified (the "highlight_rules" of settings.json)
+and searched like in the viewer, with the query language of its search box
+(see logfilter.py), and the logs are merged by time like there. Textual is
+not imported, so this also runs in cron jobs.
+"""
+import argparse
+import heapq
+import json
+import logging
+import os
+import sys
+from itertools import islice
+
+from logcache import cached_time_range
+from logengine import load_classifier
+from logfilter import FlagTerm, Query, QueryError, TimeTerm
+from logset import expand_sources
+from logstore import INF, Classifier, Columns, parse_time, stream_entries
+
+TSV_FIELDS = ["line", "profile", "start_time", "duration", "command"]  # the columns of the viewer's table
+BATCH = 1000  # entries filtered at a time, as Columns like in the viewer
+
+
+def timestamp(value: str) -> float:
+    t = parse_time(value)
+    if t != t:
+        raise argparse.ArgumentTypeError(f"not an ISO timestamp: {value!r}")
+    return t
+
+
+parser = argparse.ArgumentParser(description="Print the entries of IPython JSONL logs that match the filters",
+                                 epilog="Exits with 1 if no entry matched.")
+parser.add_argument("logfile", nargs="+", help="JSON Lines log files, glob patterns or directories; .gz and .zst files are decompressed")
+parser.add_argument("--after", type=timestamp, default=-INF, help="Only entries starting at or after this ISO timestamp")
+parser.add_argument("--before", type=timestamp, default=INF, help="Only entries starting at or before this ISO timestamp")
+parser.add_argument("--query", "--contains", dest="query", type=str, default="",
+                    help="Only entries matching this query, written like in the viewer's search box: ct 1 -www duration>30")
+parser.add_argument("--search-stdout", action="store_true", help="Let the words of --query match the stdout of the commands as well")
+parser.add_argument("--issues-only", action="store_true", help="Only entries flagged as issues by the highlight rules")
+parser.add_argument("--format", choices=["jsonl", "tsv"], default="jsonl", help="Output format (default: jsonl)")
+parser.add_argument("--fields", type=lambda s: s.split(","), help=f"Comma separated fields to print (tsv default: {','.join(TSV_FIELDS)}; jsonl default: all)")
+parser.add_argument("--count", action="store_true", help="Only print the number of matching entries")
+parser.add_argument("--settings", default="settings.json", help="Settings file with the highlight rules (default: settings.json)")
+
+
+def timed_entries(path: str):
+    """(merge key, entry) of the entries of a log."""
+    for entry in stream_entries(path):
+        t = parse_time(entry.get("start_time"))
+        yield (t if t == t else -INF), entry
+
+
+def query(paths: list[str], after: float = -INF, before: float = INF, text: Query | str = "",
+          search_stdout: bool = False, issues_only: bool = False, classifier: Classifier | None = None):
+    """
+    Yield the normalized entries of the logs that match the filters, merged
+    by time. text is a query of the viewer's search box; the time window and
+    issues_only are added to it as terms, like the viewer's filters do. Logs
+    whose index cache shows they are entirely outside [after, before] are
+    not read.
+    """
+    classifier = classifier or Classifier()
+    terms = []
+    windowed = after > -INF or before < INF
+    if windowed:
+        terms.append(TimeTerm(after, before))
+    if issues_only:
+        terms.append(FlagTerm("issue"))
+    if isinstance(text, str):
+        text = Query(text, search_stdout=search_stdout)
+    q = Query(terms=text.terms + terms)
+    classify = any(isinstance(term, FlagTerm) for term in q.terms)
+    if windowed:
+        kept = []
+        for path in paths:
+            bounds = cached_time_range(path)
+            if bounds is None or (bounds[0] <= before and bounds[1] >= after):
+                kept.append(path)
+            else:
+                logging.debug("Skipping %s, outside the time window", path)
+        paths = kept
+    merged = (entry for _, entry in heapq.merge(*(timed_entries(path) for path in paths), key=lambda item: item[0]))
+    if not q:
+        yield from merged
+        return
+    while batch := list(islice(merged, BATCH)):
+        columns = Columns()
+        for entry in batch:
+            columns.append(entry, classifier.classify(entry) if classify else 0)
+        for i in q.filter(range(len(batch)), columns, batch.__getitem__):
+            yield batch[i]
+
+
+def _tsv_value(value) -> str:
+    if value is None:
+        return ""
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format=f"{parser.prog}: %(message)s")
+    paths = expand_sources(args.logfile)
+    if not paths:
+        parser.error(f"no logs found in {' '.join(args.logfile)}")
+    missing = [path for path in paths if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"no such log: {' '.join(missing)}")
+    try:
+        text = Query(args.query, search_stdout=args.search_stdout)
+    except QueryError as e:
+        parser.error(f"--query: {e}")
+    try:
+        classifier = load_classifier(args.settings)
+    except ValueError as e:  # not JSON, or a highlight rule that is not valid
+        parser.error(f"{args.settings}: {e}")
+    entries = query(paths, args.after, args.before, text, args.search_stdout, args.issues_only, classifier)
+    fields = args.fields or (TSV_FIELDS if args.format == "tsv" else None)
+    out = sys.stdout
+    count = 0
+    try:
+        for entry in entries:
+            count += 1
+            if args.count:
+                continue
+            if args.format == "tsv":
+                out.write("\t".join(_tsv_value(entry.get(field)) for field in fields) + "\n")
+            else:
+                if fields:
+                    entry = {field: entry.get(field) for field in fields}
+                out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if args.count:
+            out.write(f"{count}\n")
+        out.flush()
+    except BrokenPipeError:
+        # the reader went away (| head), do not complain about it on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), out.fileno())
+    return 0 if count else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+"""
+Several JSONL logs read as one, in time order: the weekly segments of a
+rotated history, plain or compressed (.gz, .zst), or the logs of several
+doors.
+
+Every file has its own LogFile and its own index cache (see logcache), so
+a compressed segment whose cache is valid is only decompressed when one of
+its entries is read. Segments whose time ranges do not overlap, as rotated
+ones, are put one after the other. Segments that do overlap are merged
+entry by entry on the start time with a k-way merge.
+"""
+import glob
+import heapq
+import logging
+import os
+import re
+from array import array
+from bisect import bisect_right
+from concurrent.futures import Executor, Future
+
+from logcache import CACHE_SUFFIX, load_cache, save_cache
+from logstore import COMPRESSED_SUFFIXES, INF, Classifier, Columns, LogFile, parse_parallel, parse_time
+
+# file names taken from a directory: x.jsonl, rotated x.jsonl.1, compressed x.jsonl.2.gz
+LOG_NAME = re.compile(r"\.jsonl(\.\d+)?(\.gz|\.zst)?$")
+
+
+def expand_sources(sources: list[str]) -> list[str]:
+    """
+    The log files named by sources: file names, glob patterns and
+    directories, of which the files matching LOG_NAME are taken.
+    """
+    paths = []
+    for source in sources:
+        source = os.path.expanduser(source)
+        if os.path.isdir(source):
+            paths += sorted(os.path.join(source, name) for name in os.listdir(source) if LOG_NAME.search(name))
+        elif glob.has_magic(source):
+            paths += sorted(path for path in glob.glob(source) if not path.endswith(CACHE_SUFFIX))
+        else:
+            paths.append(source)
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+
+class MergedLogs:
+    """
+    Logs with overlapping time ranges, merged on the start time of their
+    entries. Behaves like a LogFile; all entries are parsed up front, since
+    the merge needs their times.
+    """
+
+    def __init__(self, logs: list[LogFile], columns: list[Columns], classifier: Classifier) -> None:
+        self.logs = logs
+        self.columns = columns  # complete columns of each log
+        self.classifier = classifier
+        self.source = array("H")  # entry -> index into self.logs
+        self.local = array("Q")  # entry -> index into its log
+        self._merge([0] * len(logs))
+
+    @property
+    def path(self) -> str:
+        return self.logs[-1].path
+
+    def _merge(self, starts: list[int]) -> None:
+        """Append the entries of each log from starts[k] on, merged by time."""
+        def timed(k: int, start: int):
+            times = self.columns[k].start
+            for i in range(start, len(times)):
+                t = times[i]
+                yield (t if t == t else -INF), k, i
+
+        for _, k, i in heapq.merge(*(timed(k, start) for k, start in enumerate(starts))):
+            self.source.append(k)
+            self.local.append(i)
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def __getitem__(self, index: int) -> dict:
+        return self.logs[self.source[index]][self.local[index]]
+
+    def read(self, index: int) -> dict:
+        return self.logs[self.source[index]].read(self.local[index])
+
+    def parse(self, start: int, stop: int, classifier: Classifier) -> Columns:
+        columns = Columns()
+        for k, i in zip(self.source[start:stop], self.local[start:stop]):
+            columns.append_from(self.columns[k], i)
+        return columns
+
+    def refresh(self) -> bool:
+        starts = [len(columns) for columns in self.columns]
+        for log, columns in zip(self.logs, self.columns):
+            if log.refresh():
+                return True
+            if len(log) > len(columns):
+                columns.extend(log.parse(len(columns), len(log), self.classifier))
+        # appended entries are newer than what was merged so far
+        self._merge(starts)
+        return False
+
+    def close(self) -> None:
+        for log in self.logs:
+            log.close()
+
+
+class LogSet:
+    """
+    Read-only view of several logs as one sequence of entries, the parts
+    (LogFile or MergedLogs) in time order. Behaves like a LogFile: only the
+    newest part is followed by refresh().
+    """
+
+    def __init__(self, sources: list[str], classifier: Classifier, use_cache: bool = True, max_lines: int = 0,
+                 at: float | None = None) -> None:
+        """
+        sources as for expand_sources. With max_lines > 0 only the last
+        max_lines entries of each log are indexed and no cache is used. With
+        a time at, a single plain log is opened as a window around that time
+        (see LogFile); other sources are indexed whole.
+        """
+        self.sources = sources
+        self.classifier = classifier
+        self.use_cache = use_cache and not max_lines
+        self.max_lines = max_lines
+        self.at = at
+        self._open()
+
+    def _open(self) -> None:
+        paths = expand_sources(self.sources)
+        if not paths:
+            raise FileNotFoundError(f"No logs found in {' '.join(self.sources)}")
+        self.saved: dict[str, int] = {}  # log path -> entries in its cache on disk
+        self.windowed = self.at is not None and len(paths) == 1 and not paths[0].endswith(COMPRESSED_SUFFIXES)
+        if self.windowed:
+            # the window is parsed whole by cached_columns(), it is small
+            self.parts, self.cached, self.bases = [LogFile(paths[0], at=self.at)], [None], [0]
+            logging.debug("Opened %s at %s: %s entries", paths[0], self.at, len(self.parts[0]))
+            return
+        logs, cached = [], []
+        for path in paths:
+            hit = load_cache(path, self.classifier.fingerprint) if self.use_cache else None
+            if hit is None:
+                logs.append(LogFile(path, max_lines=self.max_lines))
+                cached.append(Columns())
+            else:
+                offsets, end, columns = hit
+                logs.append(LogFile(path, offsets=offsets, end=end))
+                cached.append(columns)
+                self.saved[logs[-1].path] = len(columns)
+        times = [self._time_range(log, columns) for log, columns in zip(logs, cached)]
+        order = sorted(range(len(logs)), key=lambda k: times[k][0])
+        # group the logs whose time ranges overlap
+        groups = []
+        for k in order:
+            first, last = times[k]
+            if groups and first < groups[-1][0]:
+                groups[-1][0] = max(groups[-1][0], last)
+                groups[-1][1].append(k)
+            else:
+                groups.append([last, [k]])
+        self.parts = []
+        self.cached = []  # columns of each part read from the caches, not handed out yet
+        for _, members in groups:
+            if len(members) == 1:
+                self.parts.append(logs[members[0]])
+                self.cached.append(cached[members[0]])
+                continue
+            member_columns = []
+            for k in members:
+                columns = cached[k]
+                if len(columns) < len(logs[k]):
+                    columns.extend(logs[k].parse(len(columns), len(logs[k]), self.classifier))
+                member_columns.append(columns)
+            part = MergedLogs([logs[k] for k in members], member_columns, self.classifier)
+            logging.debug("Merged %s overlapping logs into %s entries", len(members), len(part))
+            self.parts.append(part)
+            self.cached.append(None)
+        self.bases = []  # index of the first entry of each part
+        count = 0
+        for part in self.parts:
+            self.bases.append(count)
+            count += len(part)
+
+    def _time_range(self, log: LogFile, columns: Columns) -> tuple[float, float]:
+        """Start times of the first and the last entry of a log, from its cached columns if possible."""
+        if not len(log):
+            return -INF, -INF
+        first = columns.start[0] if len(columns) else parse_time(log.read(0).get("start_time"))
+        if len(columns) == len(log):
+            last = columns.start[-1]
+        else:
+            last = parse_time(log.read(len(log) - 1).get("start_time"))
+        first = first if first == first else -INF
+        return first, last if last == last else first
+
+    @property
+    def path(self) -> str:
+        """The newest log, the one to follow."""
+        return self.parts[-1].path
+
+    @property
+    def paths(self) -> list[str]:
+        return [log.path for part in self.parts for log in (part.logs if isinstance(part, MergedLogs) else [part])]
+
+    def _spans(self, start: int, stop: int):
+        """(part number, local start, local stop) of the parts entries start..stop are in."""
+        p = bisect_right(self.bases, start) - 1
+        while start < stop:
+            base = self.bases[p]
+            hi = min(stop, base + len(self.parts[p]))
+            if hi > start:
+                yield p, start - base, hi - base
+                start = hi
+            p += 1
+
+    def __len__(self) -> int:
+        return self.bases[-1] + len(self.parts[-1])
+
+    def __getitem__(self, index: int) -> dict:
+        if index < 0:
+            index += len(self)
+        p = bisect_right(self.bases, index) - 1
+        return self.parts[p][index - self.bases[p]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.read(i)
+
+    def read(self, index: int) -> dict:
+        if index < 0:
+            index += len(self)
+        p = bisect_right(self.bases, index) - 1
+        return self.parts[p].read(index - self.bases[p])
+
+    @property
+    def at_start(self) -> bool:
+        return not self.windowed or self.parts[0].at_start
+
+    @property
+    def at_end(self) -> bool:
+        return not self.windowed or self.parts[0].at_end
+
+    def expand_back(self, count: int) -> int:
+        """
+        Add up to count entries in front of a window, returns how many; the
+        indices of the entries known so far grow by that.
+        """
+        return self.parts[0].expand_back(count) if self.windowed else 0
+
+    def expand_forward(self, count: int) -> int:
+        """Add up to count entries after a window, returns how many."""
+        return self.parts[0].expand_forward(count) if self.windowed else 0
+
+    def seek(self, at: float) -> None:
+        """Open the window around another time."""
+        self.at = at
+        self.close()
+        self._open()
+
+    def cached_columns(self) -> Columns:
+        """
+        The columns of the entries at the start of the set that the caches
+        (and merging) provide, taken only once. parse() serves the rest.
+        """
+        columns = Columns()
+        for p, part in enumerate(self.parts):
+            part_columns = self.cached[p]
+            if part_columns is None:
+                part_columns = part.parse(0, len(part), self.classifier)
+            self.cached[p] = Columns()
+            columns.extend(part_columns)
+            if len(part_columns) < len(part):
+                break
+        return columns
+
+    def parse(self, start: int, stop: int, classifier: Classifier) -> Columns:
+        """Columns of the entries start..stop, from the caches where they cover them."""
+        columns = Columns()
+        for p, lo, hi in self._spans(start, stop):
+            part, cached = self.parts[p], self.cached[p]
+            if cached is not None and lo < len(cached):
+                columns.extend(cached.slice(lo, min(hi, len(cached))))
+                lo = len(cached)
+            if lo < hi:
+                columns.extend(part.parse(lo, hi, classifier))
+        return columns
+
+    def chunks(self, start: int, stop: int, size: int):
+        """Ranges of at most size entries covering start..stop, newest first, none of them spanning two parts."""
+        for p, lo, hi in reversed(list(self._spans(start, stop))):
+            base = self.bases[p]
+            for end in range(hi, lo, -size):
+                yield base + max(end - size, lo), base + end
+
+    def _poolable(self, p: int, lo: int) -> bool:
+        part, cached = self.parts[p], self.cached[p]
+        return isinstance(part, LogFile) and not part.compressed and (cached is None or lo >= len(cached))
+
+    def parallel_bytes(self, start: int, stop: int) -> int:
+        """How much of the log text of entries start..stop submit() would hand to worker processes."""
+        return sum(self.parts[p].boundary(hi) - self.parts[p].boundary(lo)
+                   for p, lo, hi in self._spans(start, stop) if self._poolable(p, lo))
+
+    def submit(self, pool: Executor, start: int, stop: int, classifier: Classifier) -> Future | None:
+        """
+        Have a process pool parse entries start..stop (a range from chunks()).
+        None if they are cached or in a compressed log: parse them here.
+        """
+        (p, lo, hi), = self._spans(start, stop)
+        if not self._poolable(p, lo):
+            return None
+        return parse_parallel(pool, self.parts[p], [(lo, hi)], classifier)[0]
+
+    def refresh(self) -> bool:
+        """
+        Pick up entries appended to the newest log. Returns True when it was
+        truncated or replaced: the set is then opened again (the rotated log
+        becoming an older part) and has to be reloaded from scratch.
+        """
+        if self.parts[-1].refresh():
+            self.close()
+            self._open()
+            return True
+        return False
+
+    def save_cache(self, columns: Columns, count: int) -> list[str]:
+        """
+        Update the cache of every log whose entries among the first count
+        ones of columns (in the order of the set) are more than its cache
+        holds. Returns the cache files written.
+        """
+        written = []
+        if self.windowed:
+            return written  # the cache holds the start of a log
+        for p, part in enumerate(self.parts):
+            if isinstance(part, MergedLogs):
+                logs = zip(part.logs, part.columns, (len(c) for c in part.columns))
+            else:
+                base = self.bases[p]
+                n = min(max(count - base, 0), len(part))
+                logs = [(part, None, n)]
+            for log, log_columns, n in logs:
+                if n <= self.saved.get(log.path, 0):
+                    continue
+                if log_columns is None:
+                    log_columns = columns.slice(self.bases[p], self.bases[p] + n)
+                path = save_cache(log, log_columns, self.classifier.fingerprint, n)
+                if path is not None:
+                    self.saved[log.path] = n
+                    written.append(path)
+        return written
+
+    def close(self) -> None:
+        for part in self.parts:
+            part.close()
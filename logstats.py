@@ -0,0 +1,109 @@
+"""
+Duration statistics of the commands of a log, grouped by macro name (the
+first word of the command: "ascan" for "ascan mot01 0 1 10 0.1") and door,
+and the activity per hour of the day.
+
+The statistics are built from Columns and row indices in one pass, and
+add() takes further rows (appended entries) without going over the earlier
+ones again. Durations are kept per group in arrays; a group sorts them only
+when its percentiles are asked for after it changed.
+"""
+import re
+import time
+from array import array
+
+from logstore import Columns
+from perf import percentile
+
+MACRO = re.compile(r"\s*([A-Za-z_%!][\w.]*)")
+HOUR_BUCKET = 900  # seconds; time zone offsets are multiples of a quarter hour
+NAME_CACHE = 65536  # commands whose macro name is remembered, most repeat ("ct 1", "wa")
+
+
+def macro_name(command: str) -> str:
+    """The macro or function a command calls: "mv" for "mv mot01 1" and "mv(mot01, 1)"."""
+    match = MACRO.match(command)
+    return match.group(1).lstrip("%!") if match else command.strip()[:20]
+
+
+class Group:
+    __slots__ = ("count", "durations", "_sorted")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.durations = array("d")  # the known durations
+        self._sorted: array | None = None
+
+    def sorted(self) -> array:
+        if self._sorted is None or len(self._sorted) != len(self.durations):
+            self._sorted = array("d", sorted(self.durations))
+        return self._sorted
+
+
+class CommandStats:
+    """
+    Count and durations per (macro name, profile), and per hour of the day
+    the number of commands started and the seconds they took.
+    """
+
+    def __init__(self) -> None:
+        self.groups: dict[tuple[str, str], Group] = {}
+        self.count = 0
+        self.hour_counts = [0] * 24
+        self.hour_seconds = [0.0] * 24
+        self._hours: dict[int, int] = {}  # time // HOUR_BUCKET -> local hour of the day
+        self._names: dict[str, str] = {}  # command -> macro name
+
+    def add(self, columns: Columns, rows) -> None:
+        """Add the entries with the given indices."""
+        groups, hours, names = self.groups, self._hours, self._names
+        commands, profiles, starts, durations = columns.command, columns.profile, columns.start, columns.duration
+        hour_counts, hour_seconds = self.hour_counts, self.hour_seconds
+        count = 0
+        for i in rows:
+            command = commands[i]
+            name = names.get(command)
+            if name is None:
+                if len(names) >= NAME_CACHE:
+                    names.clear()
+                name = names[command] = macro_name(command)
+            key = (name, profiles[i])
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = Group()
+            group.count += 1
+            duration = durations[i]
+            if duration == duration:
+                group.durations.append(duration)
+            start = starts[i]
+            if start == start:
+                bucket = int(start // HOUR_BUCKET)
+                hour = hours.get(bucket)
+                if hour is None:
+                    hour = hours[bucket] = time.localtime(start).tm_hour
+                hour_counts[hour] += 1
+                if duration == duration:
+                    hour_seconds[hour] += duration
+            count += 1
+        self.count += count
+
+    def summary(self, by_profile: bool = False) -> list[tuple]:
+        """
+        (macro, profile, count, total, mean, p50, p95, max) per macro, or
+        per macro and door with by_profile (profile is "" otherwise).
+        """
+        merged: dict[tuple[str, str], list[Group]] = {}
+        for (name, profile), group in self.groups.items():
+            merged.setdefault((name, profile if by_profile else ""), []).append(group)
+        rows = []
+        for (name, profile), groups in merged.items():
+            if len(groups) == 1:
+                ordered = groups[0].sorted()
+            else:
+                ordered = array("d", sorted(d for group in groups for d in group.sorted()))
+            total = sum(ordered)
+            nan = float("nan")
+            rows.append((name, profile, sum(group.count for group in groups), total,
+                         total / len(ordered) if ordered else nan,
+                         percentile(ordered, 0.5), percentile(ordered, 0.95), ordered[-1] if ordered else nan))
+        return rows
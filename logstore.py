@@ -0,0 +1,801 @@
+"""
+Memory-mapped access to JSON Lines log files.
+
+The file is mapped once and a compact array of line start offsets is built in
+a single pass. Entries are only parsed (and normalized) when something asks
+for them, so opening a multi-GB history does not parse or keep every entry
+in memory. Entries appended later are indexed incrementally by refresh().
+
+The table is drawn from Columns, which holds only the short fields of every
+entry. The large stdout, result and error fields stay in the file and are
+read by byte offset when an entry is viewed.
+"""
+import ctypes
+import ctypes.util
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mmap
+import os
+import re
+import select
+import sys
+import time
+from concurrent.futures import Executor, Future
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+
+PROFILE_CODES = {
+    "spockdoor": "1",
+    "secondDoor": "2",
+    "thirdDoor": "3",
+}
+
+# entry classification bits
+ISSUE = 1
+ASCAN = 2
+FLAG_BITS = {"issue": ISSUE, "ascan": ASCAN}
+
+# used when settings.json has no "highlight_rules"
+DEFAULT_RULES = [
+    {"flag": "issue", "field": "command", "contains": "www"},
+    {"flag": "issue", "field": "stdout", "contains": "error"},
+    {"flag": "issue", "field": "stdout", "contains": "Error"},
+    {"flag": "issue", "field": "stdout", "contains": "DevError"},
+    {"flag": "ascan", "field": "command", "contains": "ct"},
+]
+
+PARSE_CACHE_SIZE = 32  # number of recently viewed entries kept parsed
+INTERN_SIZE = 65536  # distinct commands remembered for sharing one string between identical ones
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+DECOMPRESSED_CACHE_SIZE = 2  # compressed logs kept decompressed in memory at a time
+SEEK_WINDOW = 1000  # entries indexed on each side of a seek target, and added per expansion of the window
+SEEK_SCAN = 100  # lines looked at for a start time from a seek probe on
+NAN = float("nan")
+INF = float("inf")
+
+
+def strip_command(command: str) -> str:
+    """Remove the IPython magic wrapper from a logged command."""
+    if command.startswith("get_ipython().run_line_magic"):
+        command = command.replace("get_ipython().run_line_magic", "")\
+            .strip("()")\
+            .replace("\'", "")\
+            .replace("\"", "")\
+            .replace(", ", " ")\
+            .replace("%", "")
+    return command
+
+
+_interned: dict[str, str] = {}  # command -> the shared string
+
+
+def intern_command(command: str) -> str:
+    """
+    The string to keep for a command, shared by identical commands. Logs
+    repeat a few commands over and over, so the INTERN_SIZE most recent
+    distinct ones are remembered.
+    """
+    interned = _interned.get(command)
+    if interned is None:
+        if len(_interned) >= INTERN_SIZE:
+            _interned.clear()
+        interned = _interned[command] = command
+    return interned
+
+
+def normalize_entry(entry: dict) -> dict:
+    """Clean up the command string and map door names to profile codes, inplace."""
+    entry["command"] = strip_command(entry.get("command", ""))
+    profile = entry.get("profile", "")
+    entry["profile"] = PROFILE_CODES.get(profile, profile)
+    return entry
+
+
+def check_rule(number: int, rule) -> None:
+    """Raise a ValueError naming the highlight rule (the number-th) and its field if it is not valid."""
+    where = f"highlight rule {number} {json.dumps(rule)}"
+    if not isinstance(rule, dict):
+        raise ValueError(f"{where}: not an object")
+    if rule.get("flag") not in FLAG_BITS:
+        raise ValueError(f"{where}: \"flag\" is not one of {', '.join(map(repr, FLAG_BITS))}")
+    if not isinstance(rule.get("field", "command"), str):
+        raise ValueError(f"{where}: \"field\" is not the name of a field")
+    if "regex" in rule:
+        try:
+            re.compile(rule["regex"])
+        except (re.error, TypeError) as e:
+            raise ValueError(f"{where}: \"regex\" is not a regular expression: {e}") from None
+    elif not isinstance(rule.get("contains"), str):
+        raise ValueError(f"{where}: needs a \"contains\" text or a \"regex\"")
+
+
+class Classifier:
+    """
+    Sets flag bits (ISSUE, ASCAN) on entries according to a list of rules like
+    {"flag": "issue", "field": "stdout", "contains": "DevError"}, or with
+    "regex" instead of "contains". All rules for the same flag and field are
+    compiled into one regular expression. A rule that is not like that is a
+    ValueError naming the rule and what is wrong with it.
+    """
+
+    def __init__(self, rules: list[dict] | None = None) -> None:
+        self.rules = DEFAULT_RULES if rules is None else rules
+        rules = self.rules
+        if not isinstance(rules, list):
+            raise ValueError(f"highlight rules {json.dumps(rules)}: not a list")
+        patterns: dict[tuple[str, int], list[str]] = {}
+        for number, rule in enumerate(rules, 1):
+            check_rule(number, rule)
+            key = (rule.get("field", "command"), FLAG_BITS[rule["flag"]])
+            pattern = rule["regex"] if "regex" in rule else re.escape(rule["contains"])
+            patterns.setdefault(key, []).append(pattern)
+        self.matchers = [
+            (field, bit, re.compile("|".join(f"(?:{p})" for p in field_patterns)).search)
+            for (field, bit), field_patterns in patterns.items()
+        ]
+        # identifies the rules, so cached flags are not reused with other rules
+        self.fingerprint = hashlib.sha1(json.dumps(rules, sort_keys=True).encode()).hexdigest()
+
+    def classify(self, entry: dict) -> int:
+        flags = 0
+        for field, bit, search in self.matchers:
+            if not flags & bit:
+                value = entry.get(field)
+                if value and search(str(value)):
+                    flags |= bit
+        return flags
+
+
+def search_text(entry: dict, stdout: bool = False) -> str:
+    """The lowercase text the live search matches: the command, and optionally the stdout."""
+    if stdout:
+        return entry.get("command", "").lower() + "\n" + entry.get("stdout", "").lower()
+    return entry.get("command", "").lower()
+
+
+def parse_time(value) -> float:
+    """Epoch seconds of an ISO timestamp, NaN if it cannot be parsed."""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return NAN
+
+
+def format_time(t: float) -> str:
+    """Local ISO timestamp of epoch seconds, to the second; empty for NaN."""
+    return datetime.fromtimestamp(t).isoformat(timespec="seconds") if t == t else ""
+
+
+def parse_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+class Columns:
+    """
+    Struct-of-arrays copy of the columns shown in the table, one item per
+    entry: numeric columns in typed arrays, strings in lists. Commands are
+    interned.
+    """
+
+    def __init__(self) -> None:
+        self.line = array("q")
+        self.profile: list[str] = []
+        self.start = array("d")  # epoch seconds, NaN if missing
+        self.duration = array("d")  # seconds, NaN if missing
+        self.command: list[str] = []
+        self.flags = bytearray()  # Classifier bits
+        # whether start is non-decreasing without NaNs, so time ranges can be bisected
+        self.time_sorted = True
+
+    def __len__(self) -> int:
+        return len(self.command)
+
+    def __setstate__(self, state: dict) -> None:
+        # from a worker process: share the strings with the commands of this one
+        state["command"] = [intern_command(command) for command in state["command"]]
+        self.__dict__.update(state)
+
+    def extend(self, other: "Columns") -> None:
+        """Append the entries of other, which follow ours in the log."""
+        if other.start:
+            self.time_sorted = (self.time_sorted and other.time_sorted
+                                and other.start[0] >= (self.start[-1] if self.start else -INF))
+        self.line.extend(other.line)
+        self.profile.extend(other.profile)
+        self.start.extend(other.start)
+        self.duration.extend(other.duration)
+        self.command.extend(other.command)
+        self.flags.extend(other.flags)
+
+    def time_range(self, after: float, before: float) -> tuple[int, int]:
+        """
+        Index range of the entries with after <= start time <= before. Only
+        valid while time_sorted.
+        """
+        return bisect_left(self.start, after), bisect_right(self.start, before)
+
+    def append(self, entry: dict, flags: int = 0) -> None:
+        """Append a normalized entry and its classification."""
+        line, profile, start, duration, command = _column_values(entry)
+        if self.time_sorted and not start >= (self.start[-1] if self.start else -INF):
+            self.time_sorted = False
+        command = intern_command(command)
+        self.line.append(line)
+        self.profile.append(profile)
+        self.start.append(start)
+        self.duration.append(duration)
+        self.command.append(command)
+        self.flags.append(flags)
+
+    def append_from(self, other: "Columns", index: int) -> None:
+        """Append entry index of other."""
+        start = other.start[index]
+        if self.time_sorted and not start >= (self.start[-1] if self.start else -INF):
+            self.time_sorted = False
+        self.line.append(other.line[index])
+        self.profile.append(other.profile[index])
+        self.start.append(start)
+        self.duration.append(other.duration[index])
+        self.command.append(other.command[index])
+        self.flags.append(other.flags[index])
+
+    def slice(self, start: int, stop: int) -> "Columns":
+        """A copy of the entries start..stop."""
+        columns = Columns()
+        columns.line = self.line[start:stop]
+        columns.profile = self.profile[start:stop]
+        columns.start = self.start[start:stop]
+        columns.duration = self.duration[start:stop]
+        columns.command = self.command[start:stop]
+        columns.flags = self.flags[start:stop]
+        if not self.time_sorted:
+            columns.update_time_sorted()
+        return columns
+
+    def grow(self, count: int) -> None:
+        """
+        Append count blank entries, to be filled in by splice(). The start
+        times count as unsorted until update_time_sorted() is called.
+        """
+        if count <= 0:
+            return
+        self.line.extend(array("q", [-1]) * count)
+        self.profile.extend([""] * count)
+        self.start.extend(array("d", [NAN]) * count)
+        self.duration.extend(array("d", [NAN]) * count)
+        self.command.extend([""] * count)
+        self.flags.extend(bytes(count))
+        self.time_sorted = False
+
+    def splice(self, index: int, other: "Columns") -> None:
+        """Overwrite the entries from index on with the entries of other."""
+        stop = index + len(other)
+        self.line[index:stop] = other.line
+        self.profile[index:stop] = other.profile
+        self.start[index:stop] = other.start
+        self.duration[index:stop] = other.duration
+        self.command[index:stop] = other.command
+        self.flags[index:stop] = other.flags
+
+    def update_time_sorted(self) -> None:
+        start = self.start
+        self.time_sorted = all(a <= b for a, b in zip(start, start[1:])) and not (start and start[0] != start[0])
+
+
+def _column_values(entry: dict) -> tuple[int, str, float, float, str]:
+    try:
+        line = int(entry.get("line", -1))
+    except (TypeError, ValueError):
+        line = -1
+    return (line,
+            sys.intern(str(entry.get("profile", ""))),
+            parse_time(entry.get("start_time")),
+            parse_float(entry.get("duration")),
+            entry.get("command", ""))
+
+
+def parse_lines(mm, offsets: array, end: int, classifier: Classifier) -> Columns:
+    """
+    Parse, normalize and classify the entries starting at offsets, the last
+    one ending at end.
+    """
+    columns = Columns()
+    for i, start in enumerate(offsets):
+        stop = offsets[i + 1] if i + 1 < len(offsets) else end
+        entry = normalize_entry(json.loads(mm[start:stop]))
+        columns.append(entry, classifier.classify(entry))
+    return columns
+
+
+def open_stream(path: str):
+    """
+    Open a log for reading as a binary stream, decompressing .gz and .zst
+    files on the fly; .zst needs the zstandard package.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if not path.endswith(".zst"):
+        return open(path, "rb")
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(f"Reading {path} needs the zstandard package (pip install zstandard)") from None
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+
+
+def decompress(path: str) -> bytes:
+    """Contents of a .gz or .zst file."""
+    with open_stream(path) as f:
+        return f.read()
+
+
+def stream_entries(path: str):
+    """
+    Yield the normalized entries of a log one by one, in constant memory.
+    Lines that do not parse (like a partly written last one) are skipped
+    with a warning.
+    """
+    with open_stream(path) as f:
+        for number, line in enumerate(f, 1):
+            if line.isspace():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logging.warning("%s:%s: not a JSON entry, skipped", path, number)
+                continue
+            yield normalize_entry(entry)
+
+
+def _is_blank(mm, start: int, end: int) -> bool:
+    if end <= start:
+        return True
+    # only copy the line when it could be whitespace-only
+    return mm[start:start + 1].isspace() and not mm[start:end].strip()
+
+
+def _is_complete(mm, start: int, end: int) -> bool:
+    """Whether an unterminated last line holds a whole entry, or is still being written."""
+    try:
+        json.loads(mm[start:end])
+    except ValueError:
+        return False
+    return True
+
+
+def index_lines(mm, pos: int, stop: int, offsets: array) -> int:
+    """
+    Append the start offsets of the non-blank lines in mm[pos:stop] to
+    offsets, pos being the start of a line. An unterminated line at the end
+    of the file is only taken if it is a complete entry. Returns the offset
+    up to which lines were indexed.
+    """
+    while pos < stop:
+        nl = mm.find(b"\n", pos, stop)
+        if nl < 0:
+            if not _is_blank(mm, pos, stop):
+                if stop < len(mm) or not _is_complete(mm, pos, stop):
+                    break
+                offsets.append(pos)
+            pos = stop
+            break
+        if not _is_blank(mm, pos, nl):
+            offsets.append(pos)
+        pos = nl + 1
+    return pos
+
+
+def _line_time(mm, pos: int) -> float:
+    """
+    Start time of the first entry with one in the SEEK_SCAN lines from pos
+    on (a line start), INF if there is none before the end of the file.
+    """
+    for _ in range(SEEK_SCAN):
+        if pos >= len(mm):
+            break
+        nl = mm.find(b"\n", pos)
+        end = len(mm) if nl < 0 else nl
+        if not _is_blank(mm, pos, end):
+            try:
+                t = parse_time(json.loads(mm[pos:end]).get("start_time"))
+            except (ValueError, AttributeError):
+                t = NAN  # a partial last line, or not an entry
+            if t == t:
+                return t
+        pos = end + 1
+    return INF
+
+
+def seek_time(mm, t: float) -> int:
+    """
+    Byte offset of the line of the first entry starting at t or later, by
+    bisecting the file on byte offsets: each probe moves to the start of the
+    next line and parses the entry there. The log must be in time order.
+    """
+    lo, hi = 0, len(mm)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        line = mm.find(b"\n", mid - 1) + 1 if mid else 0
+        if line == 0 and mid:
+            line = len(mm)  # no further line
+        if _line_time(mm, line) >= t:
+            hi = mid
+        else:
+            lo = mid + 1
+    line = mm.find(b"\n", lo - 1) + 1 if lo else 0
+    return len(mm) if lo and line == 0 else line
+
+
+_decompressed: OrderedDict[int, "LogFile"] = OrderedDict()  # by id(), least recently read first
+
+
+class LogFile:
+    """
+    Read-only, lazily parsed view of a JSONL log file.
+
+    Behaves like a sequence of normalized entry dicts, the last few accessed
+    ones being kept parsed. With max_lines > 0 only the last max_lines entries
+    are indexed, found by scanning backwards from the end of the file. Call
+    refresh() to pick up entries appended since.
+
+    A .gz or .zst log is decompressed into memory instead of being mapped;
+    with a cached index it is only decompressed once an entry is read, and
+    only the last few decompressed logs are kept.
+
+    With a time at, only a window of SEEK_WINDOW entries on each side of the
+    first entry starting at that time is indexed, found by bisecting the
+    file; expand_back() and expand_forward() index further entries.
+    """
+
+    def __init__(self, path: str, max_lines: int = 0, offsets: array | None = None, end: int = 0,
+                 at: float | None = None) -> None:
+        """
+        offsets and end can pass in a previously built index of the start of
+        the file (see logcache), only the part after end is then indexed.
+        """
+        self.path = os.path.expanduser(path)
+        self.compressed = self.path.endswith(COMPRESSED_SUFFIXES)
+        self.max_lines = max_lines
+        self.at = None if self.compressed else at
+        self._file = None
+        self._buffer = None
+        self._cache: OrderedDict[int, dict] = OrderedDict()
+        self._load(offsets, end)
+
+    def _load(self, offsets: array | None = None, end: int = 0) -> None:
+        self.close()
+        self._file = open(self.path, "rb")
+        stat = os.fstat(self._file.fileno())
+        self._stat = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        self._cache.clear()
+        self.offsets = array("Q")
+        self.begin = 0  # byte offset from which the file has been indexed, with at
+        self.end = 0  # byte offset up to which the file has been indexed
+        self.at_end = True  # whether the index reaches the end of the file, not so with at
+        if self.compressed:
+            self._file.close()  # read whole by decompress()
+            if offsets is not None:
+                # a compressed log is not appended to, the cached index is complete
+                self.offsets, self.end = offsets, end
+                return
+        self._map()
+        if offsets is not None:
+            self.offsets = offsets
+            self._index_from(end)
+        elif self.at is not None:
+            self.begin = self.end = seek_time(self._mm, self.at)
+            self.at_end = False
+            self.expand_back(SEEK_WINDOW)
+            self.expand_forward(SEEK_WINDOW)
+        elif self.max_lines > 0:
+            self._index_tail(self.max_lines)
+        else:
+            self._index_from(0)
+
+    def _map(self) -> None:
+        if self.compressed:
+            self._buffer = decompress(self.path)
+            _decompressed[id(self)] = self
+            while len(_decompressed) > DECOMPRESSED_CACHE_SIZE:
+                _decompressed.popitem(last=False)[1]._buffer = None
+        elif os.fstat(self._file.fileno()).st_size:
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._buffer = b""  # empty files cannot be mapped
+
+    @property
+    def _mm(self):
+        """The file contents, mapped or decompressed."""
+        if self._buffer is None:
+            self._map()
+        elif self.compressed:
+            _decompressed.move_to_end(id(self))
+        return self._buffer
+
+    def _index_from(self, pos: int) -> None:
+        self.end = index_lines(self._mm, pos, len(self._mm), self.offsets)
+
+    def _index_tail(self, max_lines: int) -> None:
+        mm = self._mm
+        offsets = self.offsets
+        end = len(mm)
+        self.end = end
+        nl = mm.rfind(b"\n")
+        if not _is_blank(mm, nl + 1, end) and not _is_complete(mm, nl + 1, end):
+            end = self.end = nl + 1  # leave the partial line for refresh()
+        while end > 0 and len(offsets) < max_lines:
+            nl = mm.rfind(b"\n", 0, end)
+            start = nl + 1
+            if not _is_blank(mm, start, end):
+                offsets.append(start)
+            end = max(nl, 0)
+        offsets.reverse()
+
+    @property
+    def at_start(self) -> bool:
+        """Whether the index starts at the beginning of the file, not so with at."""
+        return self.begin == 0
+
+    def expand_back(self, count: int) -> int:
+        """
+        Index up to count entries before the indexed ones. They come first,
+        the indices of the others grow by the number returned.
+        """
+        mm = self._mm
+        added = array("Q")
+        end = self.begin - 1  # the newline ending the line before
+        while end >= 0 and len(added) < count:
+            nl = mm.rfind(b"\n", 0, end)
+            start = nl + 1
+            if not _is_blank(mm, start, end):
+                added.append(start)
+            self.begin = start
+            end = nl
+        found = len(added)
+        if found:
+            added.reverse()
+            added.extend(self.offsets)
+            self.offsets = added
+            self._cache.clear()  # by index
+        return found
+
+    def expand_forward(self, count: int) -> int:
+        """Index up to count entries after the indexed ones, returns how many."""
+        mm = self._mm
+        known = len(self.offsets)
+        stop = self.end
+        for _ in range(count):
+            nl = mm.find(b"\n", stop)
+            if nl < 0:
+                stop = len(mm)
+                break
+            stop = nl + 1
+        if stop >= len(mm):
+            self.at_end = True
+        self.end = index_lines(mm, self.end, stop, self.offsets)
+        return len(self.offsets) - known
+
+    def refresh(self) -> bool:
+        """
+        Index entries appended to the file since the last call.
+
+        Returns True when the file was truncated or replaced (rotation) and
+        the index was rebuilt from scratch, False otherwise.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False  # rotated away, the new file is not there yet
+        if self.compressed:
+            if (stat.st_ino, stat.st_size, stat.st_mtime_ns) == self._stat:
+                return False
+            self._load()
+            return True
+        if stat.st_ino != self._stat[0] or stat.st_size < self.end:
+            self._load()
+            return True
+        if stat.st_size > len(self._mm):
+            if isinstance(self._buffer, mmap.mmap):
+                self._buffer.close()
+            self._map()
+            if self.at_end:
+                self._index_from(self.end)
+        return False
+
+    def boundary(self, index: int) -> int:
+        """Byte offset where entry index starts, the end of the indexed part for index == len(self)."""
+        return self.offsets[index] if index < len(self.offsets) else self.end
+
+    def parse(self, start: int, stop: int, classifier: Classifier) -> Columns:
+        """Columns of the entries start..stop, bypassing the entry cache."""
+        return parse_lines(self._mm, self.offsets[start:stop], self.boundary(stop), classifier)
+
+    def line_end(self, index: int) -> int:
+        start = self.offsets[index]
+        end = self._mm.find(b"\n", start)
+        return len(self._mm) if end < 0 else end
+
+    def raw(self, index: int) -> bytes:
+        """Return the undecoded JSON line of an entry."""
+        return self._mm[self.offsets[index]:self.line_end(index)]
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def read(self, index: int) -> dict:
+        """Parse an entry without keeping it in the cache, for scans over many entries."""
+        return normalize_entry(json.loads(self.raw(index)))
+
+    def __getitem__(self, index: int) -> dict:
+        if index < 0:
+            index += len(self.offsets)
+        entry = self._cache.get(index)
+        if entry is not None:
+            self._cache.move_to_end(index)
+            return entry
+        entry = self.read(index)
+        self._cache[index] = entry
+        if len(self._cache) > PARSE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return entry
+
+    def __iter__(self):
+        for i in range(len(self.offsets)):
+            yield self.read(i)
+
+    def close(self) -> None:
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        self._buffer = None
+        _decompressed.pop(id(self), None)
+        if self._file is not None:
+            self._file.close()
+
+
+_classifiers: dict[str, Classifier] = {}
+
+
+def parse_chunk(path: str, offsets: array, end: int, rules: list[dict]) -> Columns:
+    """
+    parse_lines() on a log opened by path, for the worker processes of
+    parse_parallel; they return compact columns rather than entry dicts.
+    """
+    key = json.dumps(rules, sort_keys=True)
+    classifier = _classifiers.get(key)
+    if classifier is None:
+        classifier = _classifiers[key] = Classifier(rules)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return parse_lines(mm, offsets, end, classifier)
+
+
+def parse_parallel(pool: Executor, log: LogFile, ranges: list[tuple[int, int]],
+                   classifier: Classifier) -> list[Future]:
+    """
+    Have a process pool parse the entries start..stop of each range of a log.
+    Returns a future of the Columns of each range, in the order given.
+    """
+    return [pool.submit(parse_chunk, log.path, log.offsets[start:stop], log.boundary(stop), classifier.rules)
+            for start, stop in ranges]
+
+
+class FileWatcher:
+    """
+    Block until a file may have changed.
+
+    Uses inotify on the file's directory where available, so rotation is
+    noticed as well, and falls back to plain sleeping (stat polling by the
+    caller) everywhere else.
+    """
+
+    # IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    INOTIFY_MASK = 0x002 | 0x008 | 0x080 | 0x100 | 0x200
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.expanduser(path)
+        self._fd = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if libc.inotify_add_watch(fd, os.fsencode(directory), self.INOTIFY_MASK) < 0:
+            os.close(fd)
+            return
+        self._fd = fd
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    def wait(self, timeout: float) -> None:
+        """Return after a change notification or after timeout seconds."""
+        if self._fd is None:
+            time.sleep(timeout)
+            return
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if ready:
+            try:
+                while os.read(self._fd, 65536):  # drain pending events
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _intersect(small, large) -> list[int]:
+    """Intersect two sorted id sequences, the first one being the shorter."""
+    if len(large) > 8 * len(small):
+        # look the few ids up by bisection instead of walking the long list
+        result = []
+        lo = 0
+        for doc_id in small:
+            lo = bisect_left(large, doc_id, lo)
+            if lo == len(large):
+                break
+            if large[lo] == doc_id:
+                result.append(doc_id)
+        return result
+    return sorted(set(small).intersection(large))
+
+
+class TrigramIndex:
+    """
+    Inverted index from lowercase character trigrams to the sorted ids of the
+    documents (entries) containing them.
+
+    It only narrows a substring search down to candidates, the caller still
+    has to check them. Documents must be added in increasing id order.
+    """
+
+    def __init__(self) -> None:
+        self.postings: dict[str, array] = {}
+        self.size = 0  # ids below this have been indexed
+
+    def add(self, doc_id: int, text: str) -> None:
+        postings = self.postings
+        for trigram in _trigrams(text):
+            ids = postings.get(trigram)
+            if ids is None:
+                ids = postings[trigram] = array("I")
+            ids.append(doc_id)
+        self.size = doc_id + 1
+
+    def candidates(self, query: str) -> list[int] | None:
+        """
+        Sorted ids of the documents that may contain query, or None if the
+        query is too short to be narrowed down by the index.
+        """
+        if len(query) < 3:
+            return None
+        lists = []
+        for trigram in _trigrams(query):
+            ids = self.postings.get(trigram)
+            if ids is None:
+                return []
+            lists.append(ids)
+        lists.sort(key=len)
+        result = lists[0]
+        for ids in lists[1:]:
+            result = _intersect(result, ids)
+            if not result:
+                break
+        return list(result)
@@ -0,0 +1,105 @@
+"""
+Timing spans around the viewer's hot paths.
+
+    with Span("sort") as span:
+        rows = ...
+        span.rows = len(rows)
+
+Every operation keeps its latest durations, for the last and the 95th
+percentile latency shown in the viewer's performance panel, and counts the
+rows it touched. A span costs two clock reads, so spans are always on. After
+start_trace() every span is also kept with its start time, and
+write_trace() saves them as a Chrome trace (chrome://tracing, Perfetto).
+"""
+import json
+import math
+import os
+import time
+from collections import deque
+
+HISTORY = 200  # latest durations kept per operation
+
+
+class Operation:
+    __slots__ = ("durations", "count", "rows")
+
+    def __init__(self) -> None:
+        self.durations = deque(maxlen=HISTORY)
+        self.count = 0
+        self.rows = 0
+
+    @property
+    def last(self) -> float:
+        return self.durations[-1]
+
+    @property
+    def p95(self) -> float:
+        return percentile(sorted(self.durations), 0.95)
+
+
+def percentile(ordered, q: float) -> float:
+    """Nearest-rank percentile of sorted values: the smallest one with q of them at or below it. NaN for none."""
+    if not ordered:
+        return float("nan")
+    # round away the float error of n * q (0.95 * 60 is 57.00000000000001)
+    return ordered[max(math.ceil(round(len(ordered) * q, 9)) - 1, 0)]
+
+
+operations: dict[str, Operation] = {}
+_trace: list[tuple[str, float, float, int]] | None = None
+
+
+class Span:
+    """
+    Times a with block as one run of an operation; set rows to the rows it
+    touched. Blocks left by an exception (a cancelled worker) are not counted.
+    """
+    __slots__ = ("name", "rows", "started")
+
+    def __init__(self, name: str, rows: int = 0) -> None:
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self) -> "Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            record(self.name, self.started, time.perf_counter() - self.started, self.rows)
+
+
+def record(name: str, started: float, seconds: float, rows: int = 0) -> None:
+    operation = operations.get(name)
+    if operation is None:
+        operation = operations[name] = Operation()
+    operation.durations.append(seconds)
+    operation.count += 1
+    operation.rows += rows
+    if _trace is not None:
+        _trace.append((name, started, seconds, rows))
+
+
+def summary() -> str:
+    """One line per operation: the last and p95 latency, how often it ran and the rows it touched."""
+    lines = [f"{'operation':<10} {'last':>9} {'p95':>9} {'runs':>7} {'rows':>12}"]
+    for name, operation in sorted(operations.items()):
+        lines.append(f"{name:<10} {operation.last * 1000:7.1f}ms {operation.p95 * 1000:7.1f}ms "
+                     f"{operation.count:7,} {operation.rows:12,}")
+    return "\n".join(lines)
+
+
+def start_trace() -> None:
+    global _trace
+    _trace = []
+
+
+def write_trace(path: str) -> None:
+    """Write the spans since start_trace() in the Chrome trace event format."""
+    events = [
+        {"name": name, "ph": "X", "ts": started * 1e6, "dur": seconds * 1e6, "pid": os.getpid(), "tid": 0,
+         "args": {"rows": rows}}
+        for name, started, seconds, rows in _trace or []
+    ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
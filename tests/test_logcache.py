@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+
+from logcache import cache_paths, cached_time_range, load_cache, save_cache
+from logstore import Classifier, LogFile
+
+CLASSIFIER = Classifier()
+
+
+def entry(k: int, command: str = "ct 1") -> str:
+    return json.dumps({"line": k, "profile": "secondDoor", "start_time": f"2025-06-01T08:00:{k:02d}",
+                       "duration": k / 2, "command": command, "stdout": "DevError" if k == 3 else ""}) + "\n"
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = tmp_path / "history.jsonl"
+    path.write_text("".join(entry(k) for k in range(10)))
+    return str(path)
+
+
+def index(path: str) -> tuple[LogFile, object]:
+    log = LogFile(path)
+    return log, log.parse(0, len(log), CLASSIFIER)
+
+
+def test_round_trip(log_path):
+    log, columns = index(log_path)
+    assert save_cache(log, columns, CLASSIFIER.fingerprint) == cache_paths(log_path)[0]
+    offsets, end, cached = load_cache(log_path, CLASSIFIER.fingerprint)
+    assert list(offsets) == list(log.offsets)
+    assert end == log.end == os.path.getsize(log_path)
+    for name in ("line", "profile", "start", "duration", "command", "flags"):
+        assert list(getattr(cached, name)) == list(getattr(columns, name)), name
+    assert cached.time_sorted
+    log.close()
+
+
+def test_partial_cache(log_path):
+    log, columns = index(log_path)
+    save_cache(log, columns, CLASSIFIER.fingerprint, count=4)
+    offsets, end, cached = load_cache(log_path, CLASSIFIER.fingerprint)
+    assert len(offsets) == len(cached) == 4
+    assert end == log.offsets[4]
+    assert cached_time_range(log_path) is None  # not the whole log
+    log.close()
+
+
+def test_appended_tail(log_path):
+    log, columns = index(log_path)
+    save_cache(log, columns, CLASSIFIER.fingerprint)
+    log.close()
+    size = os.path.getsize(log_path)
+    with open(log_path, "a") as f:
+        f.write(entry(10) + entry(11))
+    offsets, end, cached = load_cache(log_path, CLASSIFIER.fingerprint)
+    # the cached entries are still valid, only the tail is to be indexed
+    assert len(cached) == 10
+    assert end == size
+    log, columns = index(log_path)
+    assert list(columns.command[:10]) == cached.command
+    log.close()
+
+
+def test_rewritten_prefix(log_path):
+    log, columns = index(log_path)
+    save_cache(log, columns, CLASSIFIER.fingerprint)
+    log.close()
+    with open(log_path, "w") as f:
+        f.write("".join(entry(k, "mv mot1 1") for k in range(12)))
+    assert load_cache(log_path, CLASSIFIER.fingerprint) is None
+
+
+def test_truncated(log_path):
+    log, columns = index(log_path)
+    save_cache(log, columns, CLASSIFIER.fingerprint)
+    log.close()
+    with open(log_path, "r+") as f:
+        f.truncate(log.offsets[5])
+    assert load_cache(log_path, CLASSIFIER.fingerprint) is None
+
+
+def test_other_rules(log_path):
+    log, columns = index(log_path)
+    save_cache(log, columns, CLASSIFIER.fingerprint)
+    log.close()
+    assert load_cache(log_path, Classifier([]).fingerprint) is None
+
+
+def test_time_range(log_path):
+    log, columns = index(log_path)
+    save_cache(log, columns, CLASSIFIER.fingerprint)
+    log.close()
+    assert cached_time_range(log_path) == (columns.start[0], columns.start[-1])
+    with open(log_path, "a") as f:
+        f.write(entry(10))
+    assert cached_time_range(log_path) is None  # changed since
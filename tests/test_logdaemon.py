@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from logdaemon import DaemonError, IndexServer, LogIndex, check_directory
+from logstore import Classifier
+
+
+def write(path: str, prefix: str, count: int) -> None:
+    with open(path, "w") as f:
+        for k in range(count):
+            f.write(json.dumps({"line": k, "profile": "1", "start_time": f"2025-06-01T08:00:{k:02d}",
+                                "duration": count - k, "command": f"{prefix} {k}"}) + "\n")
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    write(path, "old", 10)
+    index = LogIndex([path], Classifier(), use_cache=False)
+    index.install(index.build())
+    yield index
+    if index.engine is not None:
+        index.engine.close()
+
+
+def commands(response: dict) -> list[str]:
+    return [row[5] for row in response["rows"]]
+
+
+def test_rows(index):
+    response = index.dispatch({"op": "rows", "query": 'old -"old 3"', "offset": 0, "limit": 3})
+    assert response["total"] == 9
+    assert commands(response) == ["old 0", "old 1", "old 2"]
+    assert response["count"] == 10
+
+
+def test_sorted_rows(index):
+    response = index.dispatch({"op": "rows", "sort": "duration", "reverse": False, "offset": 0, "limit": 2})
+    assert commands(response) == ["old 9", "old 8"]
+
+
+def test_locate(index):
+    view = {"query": "", "sort": "duration", "reverse": False}
+    assert index.dispatch({"op": "locate", **view, "index": 9})["position"] == 0
+    assert index.dispatch({"op": "locate", "query": "", "time": index.engine.columns.start[4]})["position"] == 4
+
+
+def test_server_locate(index, tmp_path):
+    async def locate():
+        server = IndexServer(index, str(tmp_path / "index.sock"))
+        response = await server.dispatch({"op": "locate", "sort": "duration", "reverse": True, "index": 7})
+        return response, server.computing
+
+    response, computing = asyncio.run(locate())
+    assert response["position"] == 7 and computing == 0
+
+
+def test_entry(index):
+    assert index.dispatch({"op": "entry", "index": 3})["entry"]["command"] == "old 3"
+    with pytest.raises(IndexError):
+        index.dispatch({"op": "entry", "index": 10})
+
+
+def test_rotation_unloads(index):
+    path = index.engine.data.path
+    generation = index.generation
+    os.rename(path, path + ".1")
+    write(path, "new", 20)
+    assert index.refresh()
+    # nothing of the old columns is served until the logs are indexed again
+    assert index.dispatch({"op": "info"})["loading"]
+    response = index.dispatch({"op": "rows", "offset": 12, "limit": 3})
+    assert response["rows"] == [] and response["generation"] > generation
+    index.install(index.build())
+    assert commands(index.dispatch({"op": "rows", "offset": 12, "limit": 2})) == ["new 12", "new 13"]
+
+
+def test_appended_to_sorted_view(index):
+    request = {"op": "rows", "sort": "duration", "reverse": True, "offset": 0, "limit": 20}
+    assert commands(index.dispatch(request))[:2] == ["old 0", "old 1"]
+    with open(index.engine.data.path, "a") as f:
+        for k, duration in ((10, 5.5), (11, 20)):
+            f.write(json.dumps({"line": k, "profile": "1", "start_time": f"2025-06-01T08:00:{k:02d}",
+                                "duration": duration, "command": f"new {k}"}) + "\n")
+    assert not index.refresh()
+    assert commands(index.dispatch(request)) == ["new 11", "old 0", "old 1", "old 2", "old 3", "old 4",
+                                                 "new 10", "old 5", "old 6", "old 7", "old 8", "old 9"]
+
+
+def test_socket_directory(tmp_path):
+    directory = tmp_path / "log_viewer"
+    directory.mkdir(mode=0o700)
+    directory.chmod(0o700)
+    check_directory(str(directory))
+    (tmp_path / "link").symlink_to(directory)
+    with pytest.raises(DaemonError):
+        check_directory(str(tmp_path / "link"))
+    directory.chmod(0o755)
+    with pytest.raises(DaemonError):
+        check_directory(str(directory))
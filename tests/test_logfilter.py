@@ -0,0 +1,113 @@
+import pytest
+
+from logfilter import FlagTerm, NumberTerm, ProfileTerm, Query, QueryError, TextTerm, TimeTerm
+from logstore import Classifier, Columns, normalize_entry, parse_time
+
+ENTRIES = [
+    {"line": 1, "profile": "secondDoor", "start_time": "2025-06-01T08:00:00", "duration": 1.5,
+     "command": "get_ipython().run_line_magic('ct', '1')", "stdout": "ok"},
+    {"line": 2, "profile": "thirdDoor", "start_time": "2025-06-01T09:00:00", "duration": 40,
+     "command": "mv mot1 41", "stdout": "DevError: motor mot1 is in FAULT"},
+    {"line": 3, "profile": "thirdDoor", "start_time": "2025-06-01T10:00:00", "duration": 12,
+     "command": "ct 10", "stdout": ""},
+    {"line": 4, "profile": "secondDoor", "start_time": "2025-06-02T08:00:00", "duration": 31,
+     "command": "wa www", "stdout": ""},
+]
+
+
+@pytest.fixture
+def log():
+    entries = [normalize_entry(dict(entry)) for entry in ENTRIES]
+    classifier = Classifier()
+    columns = Columns()
+    for entry in entries:
+        columns.append(entry, classifier.classify(entry))
+    return columns, entries
+
+
+def matches(text: str, log, search_stdout: bool = False) -> list[int]:
+    columns, entries = log
+    return Query(text, search_stdout=search_stdout).filter(range(len(entries)), columns, entries.__getitem__)
+
+
+def test_words_are_separate_terms():
+    query = Query("ct 1")
+    assert [type(term) for term in query.terms] == [TextTerm, TextTerm]
+    assert [term.value for term in query.terms] == ["ct", "1"]
+
+
+def test_quoted_phrase_is_one_term():
+    query = Query('"ct 1"')
+    assert len(query.terms) == 1
+    assert query.terms[0].value == "ct 1"
+
+
+def test_field_terms():
+    number, profile, flag = Query("duration>30 profile:2 is:issue").terms
+    assert isinstance(number, NumberTerm) and number.value == 30
+    assert isinstance(profile, ProfileTerm)
+    assert isinstance(flag, FlagTerm)
+
+
+def test_negation():
+    (term,) = Query("-www").terms
+    assert term.negate
+
+
+def test_terms_cheapest_first():
+    costs = [term.cost for term in Query("stdout:error ct line>2").terms]
+    assert costs == sorted(costs)
+
+
+def test_time_of_a_day():
+    (term,) = Query("time:2025-06-01").terms
+    assert isinstance(term, TimeTerm)
+    after, before = term.value
+    assert after == parse_time("2025-06-01T00:00:00")
+    assert parse_time("2025-06-01T23:59:59") <= before < parse_time("2025-06-02T00:00:00")
+
+
+@pytest.mark.parametrize("text", ["is:bogus", "duration>abc", "command:/[/", "time>yesterday"])
+def test_invalid_queries(text):
+    with pytest.raises(QueryError):
+        Query(text)
+
+
+def test_empty_query_matches_everything(log):
+    assert not Query("")
+    assert matches("", log) == [0, 1, 2, 3]
+
+
+def test_filter(log):
+    assert matches("ct 1", log) == [0, 2]
+    assert matches('"ct 1"', log) == [0, 2]
+    assert matches("ct -10", log) == [0]
+    assert matches("duration>30", log) == [1, 3]
+    assert matches("profile:2", log) == [0, 3]
+    assert matches("line>=2 line<4", log) == [1, 2]
+    assert matches("command:/^mv /", log) == [1]
+    assert matches("time:2025-06-01", log) == [0, 1, 2]
+    assert matches("time>2025-06-01T09:00", log) == [2, 3]
+
+
+def test_filter_flags(log):
+    assert matches("is:ascan", log) == [0, 2]
+    assert matches("is:issue", log) == [1, 3]
+
+
+def test_filter_reads_the_entries(log):
+    assert matches("stdout:deverror", log) == [1]
+    assert matches("stdout:/FAULT$/", log) == [1]
+    assert matches("motor", log) == []
+    assert matches("motor", log, search_stdout=True) == [1]
+
+
+def test_refines():
+    assert Query("ct 1").refines(Query("ct"))
+    assert Query("ct 10").refines(Query("ct 1"))
+    assert Query("ct duration>30").refines(Query("duration>30"))
+    assert not Query("ct").refines(Query("ct 1"))
+    assert not Query("ct").refines(Query("mv"))
+    assert not Query("-ct1").refines(Query("-ct"))
+    assert not Query("command:ct").refines(Query("ct"))
+    assert Query("anything").refines(Query(""))
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from logquery import main, query
+from logstore import Classifier, parse_time
+
+ENTRIES = {
+    "door1.jsonl": [("08:00:00", 5, "ct 1", ""), ("08:02:00", 40, "ascan mot1 0 1 10 0.1", "DevError: FAULT"),
+                    ("08:04:00", 3, "wa www", "")],
+    "door2.jsonl": [("08:01:00", 31, "mv mot1 1", ""), ("08:03:00", 2, "ct 10", "ok")],
+}
+
+
+@pytest.fixture
+def logs(tmp_path):
+    for name, entries in ENTRIES.items():
+        with open(tmp_path / name, "w") as f:
+            for k, (time, duration, command, stdout) in enumerate(entries):
+                f.write(json.dumps({"line": k, "profile": "secondDoor", "start_time": f"2025-06-01T{time}",
+                                    "duration": duration, "command": command, "stdout": stdout}) + "\n")
+    return [str(tmp_path / name) for name in ENTRIES]
+
+
+def commands(entries) -> list[str]:
+    return [entry["command"] for entry in entries]
+
+
+def test_merged_by_time(logs):
+    assert commands(query(logs)) == ["ct 1", "mv mot1 1", "ascan mot1 0 1 10 0.1", "ct 10", "wa www"]
+
+
+def test_filters(logs):
+    assert commands(query(logs, text="ct -10")) == ["ct 1"]
+    assert commands(query(logs, text="duration>30")) == ["mv mot1 1", "ascan mot1 0 1 10 0.1"]
+    assert commands(query(logs, text="fault")) == []
+    assert commands(query(logs, text="fault", search_stdout=True)) == ["ascan mot1 0 1 10 0.1"]
+    assert commands(query(logs, after=parse_time("2025-06-01T08:01:00"),
+                          before=parse_time("2025-06-01T08:03:00"))) == ["mv mot1 1", "ascan mot1 0 1 10 0.1", "ct 10"]
+    assert commands(query(logs, issues_only=True, classifier=Classifier())) == ["ascan mot1 0 1 10 0.1", "wa www"]
+
+
+def test_main_tsv(logs, capsys, tmp_path):
+    settings = str(tmp_path / "none.json")
+    assert main([*logs, "--query", "ct", "--format", "tsv", "--settings", settings]) == 0
+    assert capsys.readouterr().out.splitlines() == ["0\t2\t2025-06-01T08:00:00\t5\tct 1",
+                                                    "1\t2\t2025-06-01T08:03:00\t2\tct 10"]
+    assert main([*logs, "--query=-www", "--count", "--settings", settings]) == 0
+    assert capsys.readouterr().out == "4\n"
+    assert main([*logs, "--query", "nothing", "--settings", settings]) == 1
+    assert capsys.readouterr().out == ""
+
+
+def test_main_jsonl_fields(logs, capsys, tmp_path):
+    main([*logs, "--query", "mv", "--fields", "command,duration", "--settings", str(tmp_path / "none.json")])
+    assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == \
+        [{"command": "mv mot1 1", "duration": 31}]
+
+
+def test_main_missing_log(logs, capsys, tmp_path):
+    with pytest.raises(SystemExit) as exit:
+        main([*logs, str(tmp_path / "gone.jsonl")])
+    assert exit.value.code == 2
+    assert "no such log: " + str(tmp_path / "gone.jsonl") in capsys.readouterr().err
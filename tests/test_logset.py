@@ -0,0 +1,69 @@
+import gzip
+import json
+
+import pytest
+
+from logset import LogSet, expand_sources
+from logstore import Classifier
+
+CLASSIFIER = Classifier()
+
+
+def lines(door: str, minutes) -> bytes:
+    return b"".join(json.dumps({"line": m, "profile": door, "start_time": f"2025-06-01T{m // 60:02d}:{m % 60:02d}:00",
+                                "duration": 1, "command": f"{door} {m}"}).encode() + b"\n" for m in minutes)
+
+
+@pytest.fixture
+def rotated(tmp_path):
+    """A history rotated twice, the oldest segment compressed."""
+    with gzip.open(tmp_path / "history.jsonl.2.gz", "wb") as f:
+        f.write(lines("1", range(0, 10)))
+    (tmp_path / "history.jsonl.1").write_bytes(lines("1", range(10, 20)))
+    (tmp_path / "history.jsonl").write_bytes(lines("1", range(20, 25)))
+    (tmp_path / "notes.txt").write_text("not a log")
+    return tmp_path
+
+
+def commands(logs: LogSet) -> list[str]:
+    return [entry["command"] for entry in logs]
+
+
+def test_expand_sources(rotated):
+    names = [path.rsplit("/", 1)[1] for path in expand_sources([str(rotated)])]
+    assert names == ["history.jsonl", "history.jsonl.1", "history.jsonl.2.gz"]
+    assert expand_sources([str(rotated / "history.jsonl*"), str(rotated / "history.jsonl")]) == \
+        expand_sources([str(rotated / "history.jsonl*")])
+
+
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_rotated(rotated, use_cache):
+    for again in (False, True):  # with the caches written by the first round
+        logs = LogSet([str(rotated)], CLASSIFIER, use_cache=use_cache)
+        assert len(logs.saved) == (3 if use_cache and again else 0)
+        assert commands(logs) == [f"1 {m}" for m in range(25)]
+        columns = logs.cached_columns()
+        columns.extend(logs.parse(len(columns), len(logs), CLASSIFIER))
+        assert list(columns.line) == list(range(25))
+        assert logs.path == str(rotated / "history.jsonl")
+        logs.save_cache(columns, len(columns))
+        logs.close()
+
+
+def test_overlapping_logs_are_merged(tmp_path):
+    (tmp_path / "door1.jsonl").write_bytes(lines("1", [0, 2, 4, 5]))
+    (tmp_path / "door2.jsonl").write_bytes(lines("2", [1, 3, 4, 8]))
+    (tmp_path / "later.jsonl").write_bytes(lines("3", [20, 21]))
+    logs = LogSet([str(tmp_path)], CLASSIFIER, use_cache=False)
+    assert commands(logs) == ["1 0", "2 1", "1 2", "2 3", "1 4", "2 4", "1 5", "2 8", "3 20", "3 21"]
+    assert list(logs.parse(2, 9, CLASSIFIER).line) == [2, 3, 4, 4, 5, 8, 20]
+    logs.close()
+
+
+def test_refresh_follows_the_newest(rotated):
+    logs = LogSet([str(rotated)], CLASSIFIER, use_cache=False)
+    with open(rotated / "history.jsonl", "ab") as f:
+        f.write(lines("1", [25, 26]))
+    assert not logs.refresh()
+    assert len(logs) == 27 and logs[-1]["command"] == "1 26"
+    logs.close()
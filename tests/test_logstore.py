@@ -0,0 +1,130 @@
+import json
+import os
+from array import array
+
+import pytest
+
+import logstore
+from logstore import ASCAN, ISSUE, Classifier, LogFile, index_lines, parse_time, seek_time
+
+
+def entry(k: int, command: str = "ct 1") -> bytes:
+    return json.dumps({"line": k, "profile": "secondDoor", "start_time": f"2025-06-01T08:{k // 60:02d}:{k % 60:02d}",
+                       "duration": 1.5, "command": command}).encode() + b"\n"
+
+
+def write(path, entries: bytes) -> str:
+    path.write_bytes(entries)
+    return str(path)
+
+
+def test_index_lines():
+    data = entry(0) + b"\n   \n" + entry(1) + entry(2)[:-1]
+    offsets = array("Q")
+    assert index_lines(data, 0, len(data), offsets) == len(data)
+    assert list(offsets) == [0, len(entry(0)) + 5, len(entry(0)) + 5 + len(entry(1))]
+
+
+def test_index_lines_partial_last_line():
+    data = entry(0) + entry(1)[:20]
+    offsets = array("Q")
+    # the last line is still being written, it is left for later
+    assert index_lines(data, 0, len(data), offsets) == len(entry(0))
+    assert list(offsets) == [0]
+
+
+def test_log_file(tmp_path):
+    log = LogFile(write(tmp_path / "history.jsonl", b"".join(entry(k, f"mv mot1 {k}") for k in range(5)) + b"\n"))
+    assert len(log) == 5
+    assert log[3]["command"] == "mv mot1 3" and log[-1]["line"] == 4
+    assert log.read(0)["profile"] == "2"  # normalized
+    assert [e["line"] for e in log] == [0, 1, 2, 3, 4]
+    assert log.raw(1) == entry(1, "mv mot1 1")[:-1]
+    log.close()
+
+
+def test_log_file_tail(tmp_path):
+    log = LogFile(write(tmp_path / "history.jsonl", b"".join(entry(k) for k in range(10))), max_lines=3)
+    assert [e["line"] for e in log] == [7, 8, 9]
+    log.close()
+
+
+def test_refresh_appended(tmp_path):
+    path = write(tmp_path / "history.jsonl", entry(0) + entry(1))
+    log = LogFile(path)
+    with open(path, "ab") as f:
+        f.write(entry(2) + entry(3)[:15])
+    assert not log.refresh()
+    assert [e["line"] for e in log] == [0, 1, 2]
+    with open(path, "ab") as f:
+        f.write(entry(3)[15:])
+    assert not log.refresh()
+    assert [e["line"] for e in log] == [0, 1, 2, 3]
+    assert not log.refresh() and len(log) == 4
+    log.close()
+
+
+def test_refresh_truncated(tmp_path):
+    path = write(tmp_path / "history.jsonl", b"".join(entry(k) for k in range(5)))
+    log = LogFile(path)
+    write(tmp_path / "history.jsonl", entry(7))
+    assert log.refresh()
+    assert [e["line"] for e in log] == [7]
+    log.close()
+
+
+def test_refresh_rotated(tmp_path):
+    path = write(tmp_path / "history.jsonl", b"".join(entry(k) for k in range(5)))
+    log = LogFile(path)
+    os.rename(path, path + ".1")
+    assert not log.refresh()  # the new log is not there yet
+    write(tmp_path / "history.jsonl", b"".join(entry(k, "new") for k in range(10, 16)))
+    assert log.refresh()
+    assert [e["line"] for e in log] == list(range(10, 16))
+    log.close()
+
+
+def test_seek_time():
+    lines = [entry(k) for k in range(0, 200, 2)]  # every other second
+    data = b"".join(lines)
+    for second, expected in ((0, 0), (1, 1), (50, 25), (51, 26), (198, 99)):
+        t = parse_time(f"2025-06-01T08:{second // 60:02d}:{second % 60:02d}")
+        assert seek_time(data, t) == len(b"".join(lines[:expected])), second
+    # after the last entry: the end, past a blank and a partial line
+    data += b"\n" + entry(200)[:30]
+    assert seek_time(data, parse_time("2025-06-01T08:03:19")) >= len(b"".join(lines))
+
+
+def test_open_at_a_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(logstore, "SEEK_WINDOW", 5)
+    path = write(tmp_path / "history.jsonl", b"".join(entry(k) for k in range(100)))
+    log = LogFile(path, at=parse_time("2025-06-01T08:00:50"))
+    assert [e["line"] for e in log] == list(range(45, 55))
+    assert not log.at_start and not log.at_end
+    assert log.expand_back(20) == 20 and log[0]["line"] == 25
+    assert log.expand_forward(3) == 3 and log[-1]["line"] == 57
+    assert log.expand_back(100) == 25 and log.at_start
+    assert log.expand_forward(100) == 42 and log.at_end
+    assert [e["line"] for e in log] == list(range(100))
+    log.close()
+
+
+def test_classify():
+    classifier = Classifier([{"flag": "issue", "field": "stdout", "contains": "DevError"},
+                             {"flag": "issue", "field": "stdout", "regex": "FAULT$"},
+                             {"flag": "ascan", "contains": "ct"}])
+    assert classifier.classify({"command": "ct 1", "stdout": "motor in FAULT"}) == ISSUE | ASCAN
+    assert classifier.classify({"command": "mv mot1 1", "stdout": "DevError: ..."}) == ISSUE
+    assert classifier.classify({"command": "wa", "stdout": "FAULT here"}) == 0
+
+
+@pytest.mark.parametrize("rule, message", [
+    ({"flag": "bug", "contains": "x"}, '"flag"'),
+    ({"flag": "issue", "field": "stdout"}, '"contains"'),
+    ({"flag": "issue", "regex": "(DevError"}, '"regex"'),
+    ({"flag": "issue", "field": 3, "contains": "x"}, '"field"'),
+    ("DevError", "not an object"),
+])
+def test_invalid_rules(rule, message):
+    with pytest.raises(ValueError, match=f"highlight rule 2 .*{message}"):
+        Classifier([{"flag": "issue", "contains": "DevError"}, rule])
@@ -0,0 +1,31 @@
+import random
+
+import pytest
+
+from logstore import TrigramIndex
+
+random.seed(5)
+WORDS = ["ct", "mv", "mot1", "mot01", "ascan", "wa", "www", "DevError", "0.1", "10", "1", "umv", "dscan", "FAULT"]
+DOCS = [" ".join(random.choice(WORDS) for _ in range(random.randint(1, 5))).lower() for _ in range(3000)]
+
+
+@pytest.fixture(scope="module")
+def index():
+    index = TrigramIndex()
+    for doc_id, text in enumerate(DOCS):
+        index.add(doc_id, text)
+    return index
+
+
+@pytest.mark.parametrize("query", ["ct 1", "mot1", "mot01 ", "ascan mot", "deverror", "www", "scan", "zzz", "t 10"])
+def test_candidates_match_a_scan(index, query):
+    found = [doc_id for doc_id, text in enumerate(DOCS) if query in text]
+    candidates = index.candidates(query)
+    assert candidates == sorted(candidates)
+    assert set(found) <= set(candidates)
+    assert [doc_id for doc_id in candidates if query in DOCS[doc_id]] == found
+
+
+def test_short_queries_are_not_narrowed(index):
+    assert index.candidates("ct") is None
+    assert index.size == len(DOCS)
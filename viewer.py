@@ -1,9 +1,9 @@
 import argparse
 from rich.text import Text
+from textual import work
 from textual.app import App, ComposeResult
 from textual.containers import Vertical, Horizontal, Grid
 from textual.widgets import (Input,
-                             DataTable,
                              Button,
                              TextArea,
                              Static,
@@ -14,49 +14,89 @@ from textual.widgets import (Input,
                              RadioButton,
                              Select,
                              )
-from textual.screen import Screen
+from textual.screen import ModalScreen, Screen
 from textual.reactive import reactive
 from textual.widgets import Input
+from textual.content import Content
 from textual.message import Message
-import json
+import asyncio
+from concurrent.futures import Future
+from contextlib import closing
+from functools import partial
+from itertools import accumulate
+import os
+import time
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 import logging
-from textual.logging import TextualHandler
-from collections import defaultdict
-
-# logging.basicConfig(
-#     level="NOTSET",
-#     handlers=[TextualHandler()],
-# )
-
-logging.basicConfig(
-    filename="app.log",         # Path to your log file
-    level=logging.DEBUG,        # Minimum level to log (DEBUG, INFO, WARNING, etc.)
-    format="%(asctime)s %(levelname)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
-
-MAX_LINES = 0  # Maximum number of lines to read from the JSONL file
+from collections import OrderedDict, defaultdict
+from typing import TYPE_CHECKING, Callable
+
+import perf
+from logengine import LogEngine, load_settings
+from logfilter import FlagTerm, Query, QueryError, TimeTerm
+from logstats import CommandStats
+from logstore import (ASCAN, INF, ISSUE, NAN, SEEK_WINDOW, Classifier, Columns, FileWatcher, TrigramIndex, format_time,
+                      parse_time)
+from virtual_table import VirtualTable
+
+if TYPE_CHECKING:
+    from logdaemon import DaemonClient  # imported when --daemon is used
+
+MAX_LINES = 0  # Only index the last N entries of the JSONL file (0 = all)
+FOLLOW_INTERVAL = 1.0  # max. seconds between file checks in follow mode (without inotify events)
+SEARCH_DEBOUNCE = 0.15  # seconds to wait for further keystrokes before searching
+SEARCH_CHUNK = 2000  # entries scanned by the search between yields to the event loop
+INDEX_CHUNK = 500  # entries indexed between yields to the event loop
+LOAD_REFRESH = 0.5  # seconds between adding the entries loaded in the background to the table
+PERF_REFRESH = 0.5  # seconds between updates of the performance panel
+DAEMON_PAGE = 200  # rows fetched from the daemon per request
+DAEMON_PAGES = 16  # pages of rows kept
+DAEMON_POLL = 0.5  # seconds between asking a daemon that is still indexing
+WINDOW_MARGIN = 50  # rows from an end of a window opened at a time at which more entries are read
+TIME_FILTERS = {  # seconds before now shown by the time filter buttons
+    "last_1h": 3600,
+    "last_6h": 6 * 3600,
+    "last_24h": 24 * 3600,
+    "last_7d": 7 * 24 * 3600,
+    "last_30d": 30 * 24 * 3600,
+}
 
 
 # --------- CLI Argument Parsing ---------
 parser = argparse.ArgumentParser(description="Inspect IPython JSONL log")
-parser.add_argument("logfile", help="Path to JSON Lines log file")
-#parser.add_argument("--before", type=str, help="Only show entries before this ISO timestamp")
-#parser.add_argument("--after", type=str, help="Only show entries after this ISO timestamp")
-#parser.add_argument("--contains", type=str, help="Only show entries where command contains this string")
-args = parser.parse_args()
-
-
-options = [
-    RadioButton("1h", id="last_1h"),
-    RadioButton("6h", id="last_6h"),
-    RadioButton("24h", id="last_24h"),
-    RadioButton("7d", id="last_7d"),
-    RadioButton("30d", id="last_30d"),
-    RadioButton("all", id="all"),
-    RadioButton("custom", id="custom"),
-]
+parser.add_argument("logfile", nargs="+", help="JSON Lines log files, glob patterns or directories; .gz and .zst files are decompressed")
+parser.add_argument("-f", "--follow", action="store_true", help="Keep watching the log file and append new entries")
+parser.add_argument("--no-cache", action="store_true", help="Do not read or write the index cache next to the log file")
+parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of processes parsing large logs on startup (1 = parse in the app process)")
+parser.add_argument("--search-stdout", action="store_true", help="Let the live search match the stdout of the commands as well")
+parser.add_argument("--before", type=str, help="Only show entries before this ISO timestamp")
+parser.add_argument("--after", type=str, help="Only show entries after this ISO timestamp")
+parser.add_argument("--contains", type=str, help="Start with this query in the search box")
+parser.add_argument("--daemon", action="store_true", help="Attach to the index daemon of the logs (see logdaemon.py), starting one if none is running")
+parser.add_argument("--socket", help="With --daemon: the socket of the daemon, e.g. one shared with other users (default: one per set of logs and highlight rules)")
+parser.add_argument("--at", type=str, help="Open at this ISO timestamp: only the entries around it are read, more as you scroll")
+parser.add_argument("--debug", action="store_true", help="Write debug messages to app.log")
+parser.add_argument("--profile", metavar="FILE", help="Write a cProfile of the session to FILE (see pstats)")
+parser.add_argument("--trace", metavar="FILE", help="Write the timing spans of the session to FILE as a Chrome trace")
+parser.add_argument("--settings", default="settings.json", help="Settings file with the options form and the highlight rules (default: settings.json)")
+
+
+def extract_defaults_from_form_definition(definition: dict) -> dict:
+    """The initial values of the options form of the settings file."""
+    result = {}
+    for section in definition.get("sections", []):
+        for field in section.get("fields", []):
+            name = field["name"]
+            default = field.get("default")
+            # Optional fallback logic (e.g. use first option if no default given)
+            if default is None and field["type"] in ("select", "radio"):
+                options = field.get("options", [])
+                if options:
+                    first = options[0]
+                    default = first["value"] if isinstance(first, dict) else first
+            result[name] = default
+    return result
 
 
 class Options(Screen):
@@ -260,6 +300,138 @@ class GridFormScreen(Screen):
             self.app.pop_screen()
 
 
+class StatsScreen(Screen):
+    """
+    Duration statistics of the commands shown in the table, grouped by macro
+    name, and their activity per hour of the day. Click a header to sort.
+    """
+    CSS = """
+    StatsScreen {
+        layout: vertical;
+        padding: 1;
+    }
+    #stats_summary {
+        height: 1;
+    }
+    #stats_table {
+        width: 1fr;
+    }
+    #stats_hours {
+        width: 48;
+        padding: 0 1;
+    }
+    """
+
+    BINDINGS = [
+        ("escape,s", "app.pop_screen", "Back"),
+        ("d", "toggle_doors", "Per door"),
+    ]
+
+    column_headers = ["macro", "door", "count", "total [s]", "mean [s]", "p50 [s]", "p95 [s]", "max [s]"]
+
+    def __init__(self, stats: CommandStats, shown: str) -> None:
+        super().__init__()
+        self.stats = stats
+        self.shown = shown  # what the statistics are of
+        self.by_door = False
+        self.sort_index = 3  # total
+        self.rows = []
+
+    def compose(self) -> ComposeResult:
+        yield Static("", id="stats_summary")
+        yield Horizontal(
+            VirtualTable(self.render_row, id="stats_table", zebra_stripes=True),
+            Static("", id="stats_hours"),
+        )
+        yield Footer()
+
+    def on_mount(self) -> None:
+        self.show_stats()
+
+    def add_rows(self, columns: Columns, rows: list[int]) -> None:
+        """Entries appended to the table."""
+        if rows:
+            self.stats.add(columns, rows)
+            self.show_stats()
+
+    def action_toggle_doors(self) -> None:
+        self.by_door = not self.by_door
+        self.show_stats()
+
+    def on_virtual_table_header_selected(self, event: VirtualTable.HeaderSelected) -> None:
+        event.stop()  # not for the app's table
+        self.sort_index = event.column_index
+        self.show_stats()
+
+    def on_virtual_table_row_highlighted(self, event: VirtualTable.RowHighlighted) -> None:
+        event.stop()  # not for the app's details pane
+
+    def show_stats(self) -> None:
+        with perf.Span("stats", self.stats.count):
+            rows = self.stats.summary(by_profile=self.by_door)
+            index = self.sort_index
+            if index < 2:
+                rows.sort(key=lambda row: row[index])
+            else:
+                rows.sort(key=lambda row: row[index] if row[index] == row[index] else -INF, reverse=True)
+        self.rows = rows
+        table = self.query_one("#stats_table", VirtualTable)
+        headers = [label + (" ↓" if i == self.sort_index else "") for i, label in enumerate(self.column_headers)]
+        table.set_columns(headers, [24, 4, 9, 12, 9, 9, 9, 9])
+        table.set_row_count(len(rows))
+        self.query_one("#stats_summary", Static).update(
+            f"{self.stats.count:,} commands in {len(rows):,} groups, of {self.shown}")
+        self.query_one("#stats_hours", Static).update(self.hour_histogram())
+
+    def render_row(self, position: int) -> list:
+        name, profile, count, *durations = self.rows[position]
+        return [name, profile, f"{count:,}"] + [f"{d:,.1f}" if d == d else "" for d in durations]
+
+    def hour_histogram(self) -> str:
+        counts, seconds = self.stats.hour_counts, self.stats.hour_seconds
+        most = max(counts) or 1
+        lines = ["hour  commands              busy"]
+        for hour in range(24):
+            bar = "█" * round(20 * counts[hour] / most)
+            lines.append(f"{hour:02d}h  {bar:<20} {counts[hour]:>8,} {seconds[hour] / 3600:6.1f}h")
+        return "\n".join(lines)
+
+
+class JumpScreen(ModalScreen):
+    """Asks for a time to jump to, dismissed with it in epoch seconds (None when cancelled)."""
+    CSS = """
+    JumpScreen {
+        align: center middle;
+    }
+    #jump_input {
+        width: 40;
+    }
+    """
+
+    BINDINGS = [
+        ("escape", "cancel", "Cancel"),
+    ]
+
+    def compose(self) -> ComposeResult:
+        yield Input(placeholder="Jump to: YYYY-MM-DD HH:MM:SS", id="jump_input")
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        event.stop()  # not a search
+        event.input.border_subtitle = ""
+        event.input.set_class(False, "-invalid")
+
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        t = parse_time(event.value.strip())
+        if t != t:
+            event.input.border_subtitle = "not an ISO timestamp"
+            event.input.set_class(True, "-invalid")
+            return
+        self.dismiss(t)
+
+    def action_cancel(self) -> None:
+        self.dismiss(None)
+
+
 class JsonlInspectorApp(App):
     CSS = """
     Screen {
@@ -272,6 +444,14 @@ class JsonlInspectorApp(App):
     #table {
         height: 30;
     }
+    #load_status {
+        height: 1;
+        color: $text-muted;
+    }
+    #perf_panel {
+        height: auto;
+        color: $text-muted;
+    }
     #details {
         height: 15;
     }
@@ -295,46 +475,50 @@ class JsonlInspectorApp(App):
     """
 
     BINDINGS = [
-        ("q", "quit", "Quit")
+        ("q", "quit", "Quit"),
+        ("t", "toggle_time_filter", "Time filter"),
+        ("p", "toggle_perf_panel", "Performance"),
+        ("s", "show_stats", "Statistics"),
+        ("c", "toggle_collapse", "Collapse repeats"),
+        ("g", "jump_to_time", "Jump to time"),
     ]
 
-    jsonl_path = args.logfile# "/home/hegedues/prog/nats/history_converted.jsonl"
-
     highlight_ascan = reactive(False)
-    form_definition = None
-
-    # read the form definition from a JSON file
-    with open("settings.json") as f:
-        form_definition = json.load(f)
-    # define the initial data for the form
-    def extract_defaults_from_form_definition(definition: dict) -> dict:
-        result = {}
-        for section in definition.get("sections", []):
-            for field in section.get("fields", []):
-                name = field["name"]
-                default = field.get("default")
-                # Optional fallback logic (e.g. use first option if no default given)
-                if default is None and field["type"] in ("select", "radio"):
-                    options = field.get("options", [])
-                    if options:
-                        first = options[0]
-                        default = first["value"] if isinstance(first, dict) else first
-                result[name] = default
-        return result
-
-    current_settings = reactive(extract_defaults_from_form_definition(form_definition))
+    current_settings = reactive(dict)
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        """args: the command line, as parsed by the parser of this module."""
+        super().__init__()
+        self.log_sources = args.logfile# ["/home/hegedues/prog/nats/history_converted.jsonl"]
+        self.follow = args.follow
+        self.search_stdout = args.search_stdout
+        self.use_cache = not args.no_cache
+        self.parse_workers = args.workers
+        self.before = args.before
+        self.after = args.after
+        self.contains = args.contains
+        self.at = args.at
+        self.settings_path = args.settings
+        # the form definition of the options screen
+        self.form_definition = load_settings(args.settings)
+        self.set_reactive(JsonlInspectorApp.current_settings, extract_defaults_from_form_definition(self.form_definition))
+        # issue and 'ascan' highlighting, see logstore.DEFAULT_RULES for the format
+        self.classifier = Classifier(self.form_definition.get("highlight_rules"))
 
     def compose(self) -> ComposeResult:
         yield Horizontal(
-            Input(placeholder="Command field live search...", id="search_input"),
+            Input(placeholder="Search: ct 1  -www  profile:2  duration>30  stdout:/DevError/  is:issue  time>=2025-06-01", id="search_input"),
             Checkbox("Highlight only", id="live_search_highlight", value=False), # this is to be able to highlight the search results in the table
         )
-        yield DataTable(id="table", zebra_stripes=True, cursor_type="row")
+        yield VirtualTable(self.render_row, id="table", zebra_stripes=True)
+        yield Static("", id="load_status")
+        yield Static("", id="perf_panel")
         yield TextArea(id="details", read_only=True, show_line_numbers=True)
         yield Horizontal(
             Checkbox("Highlight isses", id="highlight_issues", value=False),
             Checkbox("Highlight 'ascan' commands", id="highlight_ascan", value=False),
             Checkbox("Show issues only", id="show_issues_only", value=False),
+            Checkbox("Collapse repeats", id="collapse_repeats", value=False),
         )
 
         yield Horizontal(
@@ -347,7 +531,7 @@ class JsonlInspectorApp(App):
             RadioButton("24h", id="last_24h"),
             RadioButton("7d", id="last_7d"),
             RadioButton("30d", id="last_30d"),
-            RadioButton("all", id="all"),
+            RadioButton("all", id="all", value=True),
             RadioButton("custom", id="custom"),
             id="time_filter_set",
         )
@@ -370,114 +554,421 @@ class JsonlInspectorApp(App):
         self.highlight_ascan_checkbox = self.query_one("#highlight_ascan", Checkbox)
         self.highlight_issues_checkbox = self.query_one("#highlight_issues", Checkbox)
         self.show_issues_only_checkbox = self.query_one("#show_issues_only", Checkbox)
+        self.collapse_checkbox = self.query_one("#collapse_repeats", Checkbox)
         self.search_input = self.query_one("#search_input", Input)
         self.live_search_highlight = self.query_one("#live_search_highlight", Checkbox)
-        self.table = self.query_one("#table", DataTable)
+        self.table = self.query_one("#table", VirtualTable)
+        self.load_status = self.query_one("#load_status", Static)
+        self.perf_panel = self.query_one("#perf_panel", Static)
+        self.perf_panel.display = False
+        self.perf_timer = self.set_interval(PERF_REFRESH, self.update_perf_panel, pause=True)
         self.details = self.query_one("#details", TextArea)
         #self.footer_text = self.query_one("#footer_text", Static)
         self.options_bar = self.query_one("#options_bar", Horizontal)
 
-        self.data = self.load_jsonl()
-        self.strip_commands()  # this will clean up the command strings, inplace
+        self.at_time = parse_time(self.at) if self.at else None  # --at, in epoch seconds
+        # the entries, parsed, normalized and classified; opened by open_logs after the first frame
+        self.engine = LogEngine(self.log_sources, self.classifier, use_cache=self.use_cache, workers=self.parse_workers,
+                                max_lines=MAX_LINES, at=self.at_time, search_stdout=self.search_stdout)
         self.highlight_issues = False
         self.highlight_ascan = False
         self.reverse_sort = False
-        self.filtered_data = self.data.copy()
+        self.sort_column = None  # column name the table is sorted by
+        self.search_query = Query()
+        self.search_timer = None
+        self.search_rows = []  # indices of the loaded entries matching the search
+        self.listed_from = 0  # loaded entries from here on have been searched
+        self.time_window = None  # (after, before) in epoch seconds
+        self.view_query = Query()  # the time and issues-only filters
+        self.filtered_rows = self.search_rows  # search_rows, narrowed by view_query
+        self.table_rows = []  # the indices currently shown in the table, in display order
+        self.run_counts = None  # with collapsed repeats: entries in the run each table row stands for
+        self.jump_pending = None  # time to move the cursor to once the entries are loaded
         self.column_headers = ["#", "line", "spock", "start_time", "duration", "command"]
         self.sorted_column_headers = self.column_headers.copy()
-        self.build_table(self.filtered_data)
+        self.build_table(self.filtered_rows)
         self.set_focus(self.table)
-
-    def load_jsonl(self):
-        path = os.path.expanduser(self.jsonl_path)
+        if self.before or self.after:
+            self.query_one("#custom_start", Input).value = self.after or ""
+            self.query_one("#custom_end", Input).value = self.before or ""
+            self.query_one("#custom", RadioButton).value = True
+            self.time_filter_set.display = True
+        if self.contains:
+            self.search_input.value = self.contains  # searched like typed text
+        self.open_logs()
+
+    @work(exclusive=True, group="open")
+    async def open_logs(self) -> None:
+        """
+        Open the logs once the first frame is drawn: indexing the line
+        offsets and reading the index caches of large logs takes a while.
+        Then show the entries the caches had, load_entries parses the others.
+        """
+        self.load_status.update("Opening the logs")
+        self.load_status.display = True
         try:
-            with open(path, "r") as f:
-                lines = f.readlines()[-MAX_LINES:]
-                return [json.loads(line) for line in lines if line.strip()]
+            data = await asyncio.to_thread(self.engine.open_logs)
         except Exception as e:
-            self.console.print(f"Error loading log: {e}")
-            return []
-
-    def strip_commands(self):
-        for entry in self.data:
-            command = entry.get("command", "")
-            if command.startswith("get_ipython().run_line_magic"):
-                # Remove the magic command wrapper
-                command = command.replace("get_ipython().run_line_magic", "")\
-                    .strip("()")\
-                    .replace("\'", "")\
-                    .replace("\"", "")\
-                    .replace(", ", " ")\
-                    .replace("%", "")
-            entry["command"] = command
-            profile = entry.get("profile", "")
-            if profile == 'spockdoor':
-                profile = '1'
-            elif profile == 'secondDoor':
-                profile = '2'
-            elif profile == 'thirdDoor':
-                profile = '3'
-            entry["profile"] = profile
-
-    def issue_filter(self, entry: dict) -> bool:
-        """
-        Filter function to determine if an entry is an issue.
-        This can be customized based on the criteria for issues.
-        """
-        if 'www' in entry.get("command", ""):
-            return True
-        if 'error' in entry.get("stdout", "") or 'Error' in entry.get("stdout", ""):
-            return True
-        if 'DevError' in entry.get("stdout", ""):
-            return True
-    
-    def issues_only_filter(self,) -> None:
-        self.filtered_data = [e for e in self.data if self.issue_filter(e)]
-        self.build_table(self.filtered_data)
+            self.load_status.update(f"Error loading log: {e}")
+            return
+        self.engine.open(data)
+        self.show_entries()
+        self.table.move_cursor(self.table.row_count - 1)  # newest entry
+        if self.at_time is not None:
+            self.jump_to_time(self.at_time)
+        if self.follow:
+            self.run_worker(self.follow_log(), group="follow", exclusive=True)
+
+    def read_entry(self, index: int) -> dict:
+        """An entry, read from its log by byte offset; recently viewed ones are cached."""
+        return self.engine[index]
+
+    @work(exclusive=True, group="load")
+    async def load_entries(self) -> None:
+        """
+        Fill the columns of the engine in the background, newest entries
+        first, and add them to the table as they arrive. Then update the
+        index cache and build the search index.
+        """
+        engine = self.engine
+        total = engine.load_next - engine.load_start
+        started, shown = time.monotonic(), 0.0
+        self.load_status.display = total > 0
+        with perf.Span("load", total), closing(engine.parse_batches()) as batches:
+            for start, columns in batches:
+                if isinstance(columns, Future):  # parsed by a worker process
+                    columns = await asyncio.wrap_future(columns)
+                engine.add_batch(start, columns)
+                now = time.monotonic()
+                if now - shown >= LOAD_REFRESH:
+                    shown = now
+                    loaded = len(engine) - (engine.load_next - engine.load_start)
+                    rate = (total - (engine.load_next - engine.load_start)) / max(now - started, 1e-3)
+                    self.load_status.update(f"Loading: {loaded:,} of {len(engine):,} entries ({rate:,.0f} entries/s)")
+                    self.show_loaded()
+                await asyncio.sleep(0)
+            self.load_status.display = False
+            if total:
+                engine.finish_loading()
+                self.show_loaded()
+                logging.debug("Loaded %s entries in %.2fs", total, time.monotonic() - started)
+        if self.jump_pending is not None:
+            self.move_to_time(self.jump_pending)
+            self.jump_pending = None
+        await self.save_index_cache()
+        self.build_index()
+
+    def show_loaded(self) -> None:
+        """
+        Add the entries loaded since the last call to the search results and
+        the table. Older entries arrive later, they are added above.
+        """
+        at_bottom = self.table.cursor_row >= self.table.row_count - 1
+        new = self.engine.filter(self.search_query, range(self.engine.load_next, self.listed_from))
+        split = bisect_left(self.search_rows, self.listed_from)
+        self.search_rows = self.search_rows[:split] + new + self.search_rows[split:]
+        self.listed_from = self.engine.load_next
+        self.apply_filters()
+        if at_bottom:
+            self.table.move_cursor(self.table.row_count - 1)
+
+    async def save_index_cache(self) -> None:
+        paths = await asyncio.to_thread(self.engine.save_cache)
+        for path in paths:
+            logging.debug("Saved index cache %s", path)
+
+    async def on_unmount(self) -> None:
+        await self.save_index_cache()
+
+    async def follow_log(self) -> None:
+        """
+        Watch the log file and append entries as they are written.
+        """
+        watcher = FileWatcher(self.engine.data.path)
+        logging.debug("Following %s (%s)", self.engine.data.path, "inotify" if watcher.uses_inotify else "polling")
+        try:
+            while True:
+                await asyncio.to_thread(watcher.wait, FOLLOW_INTERVAL)
+                self.append_new_entries()
+        finally:
+            watcher.close()
+
+    def append_new_entries(self) -> None:
+        new = self.engine.refresh()
+        if new is None:
+            # truncated or rotated: everything we had is gone
+            logging.debug("%s was truncated or replaced, reloading", self.engine.data.path)
+            self.reload()
+            return
+        if not new:
+            return
+        at_bottom = self.table.cursor_row >= self.table.row_count - 1
+        self.add_entries(new.start)
+        if at_bottom:
+            self.table.move_cursor(row=self.table.row_count - 1)
+        logging.debug("Appended %s new entries", len(new))
+
+    def reload(self) -> None:
+        """Start over with the entries of the engine, after its logs were opened again."""
+        self.workers.cancel_group(self, "index")
+        self.engine.reset()
+        self.show_entries()
+
+    def show_entries(self) -> None:
+        """Show the entries the engine has loaded, and load the others in the background."""
+        self.search_rows = self.engine.filter(self.search_query, self.engine.loaded_rows())
+        self.listed_from = self.engine.load_next
+        self.apply_filters()
+        self.load_entries()
+
+    def add_entries(self, first_new: int) -> None:
+        """Show the entries from first_new on that match, which the engine added at the end."""
+        engine = self.engine
+        new = engine.filter(self.search_query, range(first_new, len(engine)))
+        self.search_rows.extend(new)
+        shown = engine.filter(self.view_query, new)
+        if self.filtered_rows is not self.search_rows:
+            self.filtered_rows.extend(shown)
+        if isinstance(self.screen, StatsScreen):
+            self.screen.add_rows(engine.columns, shown)
+        if not shown:
+            return
+        if self.sort_column is not None:
+            if self.run_counts is not None:
+                # the runs are those of the sorted rows, the new ones can continue any of them
+                self.build_table(self.sort_rows(self.filtered_rows))
+                return
+            cursor = self.table.cursor_row
+            entry = self.table_rows[cursor] if 0 <= cursor < len(self.table_rows) else None
+            engine.insort(self.table_rows, shown, self.sort_column, self.reverse_sort)
+            # rows merged in above the cursor's entry move it down
+            cursor = self.table_rows.index(entry) if entry is not None else None
+            self.table.set_row_count(len(self.table_rows), cursor_row=cursor)
+            return
+        if self.run_counts is not None:
+            self.extend_runs(shown)
+        elif self.table_rows is not self.filtered_rows:
+            self.table_rows.extend(shown)
+        self.table.set_row_count(len(self.table_rows))
+
+    def prepend_entries(self, count: int) -> None:
+        """
+        Show the count entries added in front of a window that match. The
+        indices of the entries known so far grow by count.
+        """
+        top, cursor = self.table.scroll_y, self.table.cursor_row
+        # a build under way would go on indexing the entries at their old indices
+        indexed = (self.engine.search_index is not None
+                   or any(worker.group == "index" and not worker.is_finished for worker in self.workers))
+        self.workers.cancel_group(self, "index")
+        self.engine.prepend(count)
+        self.search_rows = (self.engine.filter(self.search_query, range(count))
+                            + [i + count for i in self.search_rows])
+        self.table_rows = [i + count for i in self.table_rows]  # for build_table to keep the cursor's entry
+        self.listed_from += count
+        if indexed:
+            self.build_index()
+        self.apply_filters()
+        # keep the view on the same rows
+        self.table.scroll_to(y=top + self.table.cursor_row - cursor, animate=False, immediate=True)
+        logging.debug("Read %s entries in front of the window", count)
+
+    def expand_window(self) -> None:
+        """
+        Read more entries of a log opened at a time when the view comes near
+        one of the ends of what was read.
+        """
+        data = self.engine.data
+        if (data is None or not data.windowed or self.engine.loading
+                or not self.table.size.height  # not laid out yet
+                or any(worker.group == "search" and worker.is_running for worker in self.workers)):
+            return
+        top = int(self.table.scroll_y)
+        bottom = top + self.table.scrollable_content_region.height
+        if min(top, self.table.cursor_row) < WINDOW_MARGIN and not data.at_start:
+            count = data.expand_back(SEEK_WINDOW)
+            if count:
+                self.prepend_entries(count)
+        elif max(bottom, self.table.cursor_row) >= self.table.row_count - WINDOW_MARGIN and not data.at_end:
+            first_new = len(data)
+            if data.expand_forward(SEEK_WINDOW):
+                self.engine.append(first_new)
+                self.add_entries(first_new)
+
+    def on_virtual_table_scrolled(self, event: VirtualTable.Scrolled) -> None:
+        if event.table is self.table:
+            self.expand_window()
+
+    def action_jump_to_time(self) -> None:
+        self.push_screen(JumpScreen(), self.jump_to_time)
+
+    def jump_to_time(self, t: float | None) -> None:
+        """
+        Move the cursor to the first entry starting at t or later. A log
+        opened at a time is opened again around t if t is not in the window.
+        """
+        if t is None:
+            return
+        data = self.engine.data
+        if data is not None and data.windowed:
+            starts = self.engine.columns.start
+            if not ((data.at_start or (starts and starts[0] <= t))
+                    and (data.at_end or (starts and starts[-1] >= t))):
+                data.seek(t)
+                self.reload()
+        if data is None or self.engine.loading:
+            self.jump_pending = t  # moved to by load_entries
+        else:
+            self.move_to_time(t)
+
+    def move_to_time(self, t: float) -> None:
+        if self.table_rows:
+            self.table.move_cursor(self.engine.locate_time(self.table_rows, t, in_order=self.sort_column is None,
+                                                           runs=self.run_counts is not None))
+
+    @work(exclusive=True, group="index")
+    async def build_index(self) -> None:
+        """
+        Build the trigram index for the live search in the background, once
+        all entries are loaded. Until it is done the search scans the entries.
+        """
+        engine = self.engine
+        index = TrigramIndex()
+        with perf.Span("index") as span:
+            while index.size < len(engine):
+                engine.index_entries(index, index.size, min(index.size + INDEX_CHUNK, len(engine)))
+                await asyncio.sleep(0)
+            span.rows = index.size
+        engine.search_index = index
+        logging.debug("Search index built: %s trigrams over %s entries", len(index.postings), index.size)
+
+    def view_filter(self) -> Query:
+        """The time window and the issues-only checkbox, as query terms."""
+        terms = []
+        if self.time_window is not None:
+            terms.append(TimeTerm(*self.time_window))
+        if self.show_issues_only_checkbox.value:
+            terms.append(FlagTerm("issue"))
+        return Query(terms=terms)
+
+    def apply_filters(self) -> None:
+        """
+        Narrow the search results down by the time window and the issues-only
+        filter, and show them.
+        """
+        self.view_query = self.view_filter()
+        rows = self.search_rows
+        if self.view_query:
+            with perf.Span("filter", len(rows)):
+                rows = self.engine.filter(self.view_query, rows)
+        self.filtered_rows = rows
+        if self.sort_column is not None:
+            rows = self.sort_rows(rows)
+        self.build_table(rows)
 
 
     def on_checkbox_changed(self, event: Checkbox.Changed) -> None:
         if event.checkbox.id == "highlight_ascan":
             self.highlight_ascan = event.checkbox.value
+            self.restyle(ASCAN)
         elif event.checkbox.id == "highlight_issues":
             self.highlight_issues = event.checkbox.value
-        elif event.checkbox.id == "show_issues_only":
-            self.issues_only_filter()
-        self.build_table(self.filtered_data)
+            self.restyle(ISSUE)
+        elif event.checkbox.id in ("show_issues_only", "collapse_repeats"):
+            self.apply_filters()
+
+    def action_toggle_collapse(self) -> None:
+        self.collapse_checkbox.toggle()
 
-    async def on_data_table_header_selected(self, event: DataTable.HeaderSelected) -> None:
+    def restyle(self, flag: int) -> None:
+        """
+        Redraw the rendered rows whose entries have a flag, after its
+        highlighting was switched. The other rows and the rows list stay.
+        """
+        flags, rows = self.engine.columns.flags, self.table_rows
+        with perf.Span("restyle") as span:
+            stale = [p for p in self.table.rendered_rows if p < len(rows) and flags[rows[p]] & flag]
+            self.table.refresh_rows(stale)
+            span.rows = len(stale)
+
+    def action_show_stats(self) -> None:
+        stats = CommandStats()
+        stats.add(self.engine.columns, self.filtered_rows)
+        shown = f"{len(self.filtered_rows):,} entries shown"
+        if self.search_query or self.view_query:
+            shown += " (filtered)"
+        if self.engine.loading:
+            shown += ", still loading"
+        self.push_screen(StatsScreen(stats, shown))
+
+    def action_toggle_perf_panel(self) -> None:
+        self.perf_panel.display = not self.perf_panel.display
+        if self.perf_panel.display:
+            self.update_perf_panel()
+            self.perf_timer.resume()
+        else:
+            self.perf_timer.pause()
+
+    def update_perf_panel(self) -> None:
+        self.perf_panel.update(perf.summary())
+
+    def action_toggle_time_filter(self) -> None:
+        self.time_filter_set.display = not self.time_filter_set.display
+        custom = self.time_filter_set.pressed_button is not None and self.time_filter_set.pressed_button.id == "custom"
+        self.time_filter_range_container.display = self.time_filter_set.display and custom
+
+    def on_radio_set_changed(self, event: RadioSet.Changed) -> None:
+        if event.radio_set.id != "time_filter_set":
+            return
+        button_id = event.pressed.id
+        self.time_filter_range_container.display = button_id == "custom"
+        if button_id == "custom":
+            self.time_window = self.custom_time_window()
+        elif button_id in TIME_FILTERS:
+            self.time_window = (time.time() - TIME_FILTERS[button_id], INF)
+        else:
+            self.time_window = None
+        logging.debug("Time window: %s", self.time_window)
+        self.apply_filters()
+
+    def custom_time_window(self) -> tuple[float, float] | None:
         """
-        Handle header selection in the DataTable.
+        The window given by the custom start/end inputs (empty means open
+        ended), or the current one while an input does not parse.
+        """
+        window = []
+        for input_id, unbounded in (("#custom_start", -INF), ("#custom_end", INF)):
+            value = self.query_one(input_id, Input).value.strip()
+            if not value:
+                window.append(unbounded)
+                continue
+            t = parse_time(value)
+            if t != t:  # NaN, not a valid timestamp (yet)
+                return self.time_window
+            window.append(t)
+        return None if window == [-INF, INF] else tuple(window)
+
+    async def on_virtual_table_header_selected(self, event: VirtualTable.HeaderSelected) -> None:
+        """
+        Handle header selection in the table.
         This can be used to sort or filter data based on the selected column.
         """
+        if event.table is not self.table:
+            return
         col_name = str(event.label)
         if col_name.endswith(" ↑") or col_name.endswith(" ↓"):
             # If the column is already sorted, toggle the sort direction
             col_name = col_name[:-2]
-        logging.debug(f"Header selected: {col_name}")
+        logging.debug("Header selected: %s", col_name)
         if col_name in ["#", 'spock']:
             return None
 
         #reverse = getattr(self, "reverse_sort", False)
         self.reverse_sort = not self.reverse_sort
-        logging.debug(f"{self.reverse_sort=}")
-
-        def cast(val, col_name=col_name):
-            if col_name in ("line", "start_time", "duration"):
-                # Attempt to convert to float for numerical sorting
-                try:
-                    return float(val)
-                except ValueError:
-                    return val
-            if col_name == "command":
-                # For command, we keep it as a string
-                return val
-
-        self.sorted_data = sorted(
-            self.filtered_data,
-            key=lambda row: cast(row[col_name]),
-            reverse=self.reverse_sort
-        )
+        self.sort_column = col_name
+        logging.debug("self.reverse_sort=%r", self.reverse_sort)
+
+        self.sorted_rows = self.sort_rows(self.filtered_rows)
 
         # update the header style to indicate sorting
         arrow = " ↓" if self.reverse_sort else " ↑"
@@ -485,99 +976,180 @@ class JsonlInspectorApp(App):
         for coln in self.column_headers:
             if coln != str(col_name):
                 self.sorted_column_headers.append(coln)
-                #logging.debug(f"Column {col_name} not sorted, keeping original order")
+                #logging.debug("Column %s not sorted, keeping original order", col_name)
             elif coln == str(col_name):
                 self.sorted_column_headers.append(coln + arrow)
-                logging.debug(f"Column {coln} sorted, adding arrow: {arrow}")
-
-        logging.debug(f"Sorted column headers: {self.sorted_column_headers}")
+                logging.debug("Column %s sorted, adding arrow: %s", coln, arrow)
 
-        self.build_table(self.sorted_data)
-        logging.debug(f"Data sorted by <{str(event.label)}> in {'descending' if self.reverse_sort else 'ascending'} order")
+        logging.debug("Sorted column headers: %s", self.sorted_column_headers)
 
+        self.build_table(self.sorted_rows)
+        logging.debug("Data sorted by <%s> in %s order", event.label, "descending" if self.reverse_sort else "ascending")
 
 
 
-    def build_table(self, data: list[dict] | None = None) -> None:
-        current_scroll = self.table.scroll_y
-        focused_row = self.table.cursor_row
 
-        self.table.clear(columns=True)
-        self.table.add_columns(*self.sorted_column_headers)
-        self.table.column_labels = self.sorted_column_headers  # this can be used to set the column labels, but keep column names internally
-        for i, entry in enumerate(data):
-            
-            if self.highlight_issues and self.issue_filter(entry):
-                styled_row = [
-                    str(i + 1),
-                    str(entry.get("line", "")),
-                    entry.get("profile", ""),
-                    entry.get("start_time", "").partition(".")[0],  # Remove milliseconds,
-                    entry.get("duration", ""),
-                    Text(str(entry.get("command", "")[:80]), style="bold red"),
-                    ]
-            elif self.highlight_ascan and 'ct' in entry.get("command", ""):
-                styled_row = [
-                    str(i + 1),
-                    str(entry.get("line", "")),
-                    entry.get("profile", ""),
-                    entry.get("start_time", "").partition(".")[0],  # Remove milliseconds,
-                    entry.get("duration", ""),
-                    Text(str(entry.get("command", "")[:80]), style="bold green"),
-                    ]
-            else:
-                styled_row = [
-                    str(i + 1),
-                    str(entry.get("line", "")),
-                    entry.get("profile", ""),
-                    entry.get("start_time", "").partition(".")[0],  # Remove milliseconds
-                    entry.get("duration", ""),
-                    entry.get("command", "")[:80]]
-            self.table.add_row(*styled_row)
-        try:
-            self.table.scroll_y = current_scroll  # Restore scroll position
-            self.table.focused_raw = (focused_row)
-        except:
-            pass
-            # self.table.add_row(
-            #     str(entry.get("line", "")),
-            #     entry.get("start_time", ""),
-            #     entry.get("command", "")[:80]
-            # )
+    def sort_rows(self, rows: list[int]) -> list[int]:
+        """Order rows (ascending entry indices) by the sort column."""
+        return self.engine.sort(rows, self.sort_column, self.reverse_sort)
 
-#    def update_table(self):
-#        for i, entry in enumerate(self.filtered_data):
+    def make_row(self, i: int, index: int, repeats: int = 1) -> list:
+        """
+        Cells of a table row, from the columns of the engine: the entry
+        itself is only read from the file for the details pane.
+        """
+        columns = self.engine.columns
+        return self.row_cells(i, columns.line[index], columns.profile[index], columns.start[index],
+                              columns.duration[index], columns.command[index], columns.flags[index], repeats)
 
+    def row_cells(self, i: int, line: int, profile: str, start: float, duration: float, command: str, flags: int,
+                  repeats: int = 1) -> list:
+        """
+        Cells of row i of the table. A row standing for a run of repeats of
+        a command shows their number: "ct 1 ×240".
+        """
+        command = command[:80]
+        if repeats > 1:
+            suffix = f" ×{repeats}"
+            command = command[:80 - len(suffix)] + suffix
+        if self.highlight_issues and flags & ISSUE:
+            command = Text(command, style="bold red")
+        elif self.highlight_ascan and flags & ASCAN:
+            command = Text(command, style="bold green")
+        return [
+            str(i + 1),
+            str(line) if line >= 0 else "",
+            profile,
+            format_time(start),  # to the second
+            str(duration) if duration == duration else "",
+            command,
+            ]
+
+    def render_row(self, position: int) -> list:
+        """
+        Row callback of the table, only called for rows that are scrolled into view.
+        """
+        if self.run_counts is not None:
+            return self.make_row(position, self.table_rows[position], self.run_counts[position])
+        return self.make_row(position, self.table_rows[position])
+
+    def extend_runs(self, rows: list[int]) -> None:
+        """Add appended rows to the collapsed table, the first ones may continue its last run."""
+        firsts, counts = self.engine.collapse(rows)
+        commands = self.engine.columns.command
+        if firsts and self.table_rows and commands[self.table_rows[-1]] == commands[firsts[0]]:
+            self.run_counts[-1] += counts[0]
+            self.table.refresh_rows([len(self.table_rows) - 1])
+            firsts, counts = firsts[1:], counts[1:]
+        self.table_rows.extend(firsts)
+        self.run_counts.extend(counts)
+
+    def build_table(self, rows: list[int] | None = None) -> None:
+        """
+        Show the entries with the given indices. The table renders rows on
+        demand, so this only swaps the index list; the cursor stays on the same
+        entry if it is still shown.
+        """
+        cursor = self.table.cursor_row
+        if 0 <= cursor < len(self.table_rows):
+            try:
+                cursor = rows.index(self.table_rows[cursor])
+            except ValueError:
+                pass
+        self.run_counts = None
+        if self.collapse_checkbox.value:
+            rows, self.run_counts = self.engine.collapse(rows)
+            cursor = bisect_right(list(accumulate(self.run_counts)), cursor)  # the run with the cursor's entry
+        self.table_rows = rows
+        widths = [len(str(len(rows))), 8, 5, 19, 9, 80]  # "#", line, spock, start_time, duration, command
+        self.table.set_columns(self.sorted_column_headers, widths)
+        self.table.set_row_count(len(rows), cursor_row=cursor)
 
     def on_input_changed(self, event: Input.Changed) -> None:
-        query = event.value.strip().lower()
-        self.filtered_data = [
-            e for e in self.data if query in e.get("command", "").lower()
-        ]
-        self.build_table(self.filtered_data)
-
-    def on_data_table_row_highlighted(self, event: DataTable.RowHighlighted) -> None:
-        #logging.debug(f"Row selected: {event.row_key}")
-        row_index = self.table.get_row_index(event.row_key)
-        if row_index is not None and 0 <= row_index < len(self.filtered_data):
-            entry = self.filtered_data[row_index]
-            details = ["Command:", entry.get("command", "")]
-            if entry.get("stdout"):
-                details.append("\nStdout:")
-                details.append(entry.get("stdout", ""))
-            if entry.get("result"):
-                details.append("\nResult:")
-                details.append(entry.get("result", ""))
-            if entry.get("error"):
-                details.append("\nError:")
-                details.append(entry.get("error", ""))
-            self.details.text = "\n".join(details)
-            # self.details.text = (
-            #     f"Command:\n{entry['command']}\n\n"
-            #     f"Stdout:\n{entry['stdout']}\n\n"
-            #     f"Result:\n{entry['result']}\n\n"
-            #     f"Error:\n{entry['error']}"
-            # )
+        if event.input.id in ("custom_start", "custom_end"):
+            if self.time_filter_set.pressed_button is not None and self.time_filter_set.pressed_button.id == "custom":
+                window = self.custom_time_window()
+                if window != self.time_window:
+                    self.time_window = window
+                    self.apply_filters()
+            return
+        if self.search_timer is not None:
+            self.search_timer.stop()
+        try:
+            query = Query(event.value, search_stdout=self.search_stdout)
+        except QueryError as e:
+            self.search_input.border_subtitle = Content(str(e))  # not markup
+            self.search_input.set_class(True, "-invalid")
+            return
+        self.search_input.border_subtitle = ""
+        self.search_input.set_class(False, "-invalid")
+        self.search_timer = self.set_timer(SEARCH_DEBOUNCE, partial(self.search, query))
+
+    @work(exclusive=True, group="search")
+    async def search(self, query: Query) -> None:
+        """
+        Filter the entries by the search query, without blocking the UI.
+
+        A newer search cancels this one. Candidates come from the trigram
+        index when it is ready and the query has a text to look up;
+        otherwise, if the query narrows the previous one, only the previous
+        matches are filtered. While the log is still loading only the loaded
+        entries are searched, load_entries adds the others as they arrive.
+        """
+        engine = self.engine
+        listed_from = engine.load_next
+        candidates = engine.candidates(query)
+        if candidates is None:
+            if self.search_query and query.refines(self.search_query):
+                candidates = self.search_rows.copy()
+                listed_from = self.listed_from
+            else:
+                candidates = engine.loaded_rows()
+        known = len(engine)
+        matches = []
+        with perf.Span("search", len(candidates)):
+            for start in range(0, len(candidates), SEARCH_CHUNK):
+                matches += engine.filter(query, candidates[start:start + SEARCH_CHUNK])
+                await asyncio.sleep(0)  # let keystrokes (and cancellation) through
+            # entries appended by follow mode while we were scanning
+            matches += engine.filter(query, range(known, len(engine)))
+        logging.debug("Search %r: %s of %s candidates", query, len(matches), len(candidates))
+        self.search_query = query
+        self.search_rows = matches
+        self.listed_from = listed_from
+        self.apply_filters()
+
+    def on_virtual_table_row_highlighted(self, event: VirtualTable.RowHighlighted) -> None:
+        if event.table is not self.table:
+            return
+        if not self.details.is_attached:
+            return  # posted just before the app exited
+        self.expand_window()
+        row_index = event.cursor_row
+        if 0 <= row_index < len(self.table_rows):
+            with perf.Span("details", 1):
+                entry = self.read_entry(self.table_rows[row_index])
+            self.show_details(entry)
+
+    def show_details(self, entry: dict) -> None:
+        """The entry in the details pane."""
+        details = ["Command:", entry.get("command", "")]
+        if entry.get("stdout"):
+            details.append("\nStdout:")
+            details.append(entry.get("stdout", ""))
+        if entry.get("result"):
+            details.append("\nResult:")
+            details.append(entry.get("result", ""))
+        if entry.get("error"):
+            details.append("\nError:")
+            details.append(entry.get("error", ""))
+        self.details.text = "\n".join(details)
+        # self.details.text = (
+        #     f"Command:\n{entry['command']}\n\n"
+        #     f"Stdout:\n{entry['stdout']}\n\n"
+        #     f"Result:\n{entry['result']}\n\n"
+        #     f"Error:\n{entry['error']}"
+        # )
     
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "options_btn":
@@ -585,11 +1157,312 @@ class JsonlInspectorApp(App):
                                             current_state=self.current_settings))
     
     def on_screen_result(self, message: ScreenResult):
-        logging.info("Received form result:", message.data)
+        logging.info("Received form result: %s", message.data)
         self.current_settings = message.data
         
 
 
+class RemoteRows:
+    """
+    The rows of a view served by a daemon, fetched a page at a time as the
+    table shows them. Indexing gives the entry index of a row, like the
+    table_rows list of the app.
+    """
+
+    def __init__(self, daemon: "DaemonClient", view: dict, total: int,
+                 on_missing: Callable[["RemoteRows", int], None] | None = None) -> None:
+        self.daemon = daemon
+        self.view = view
+        self.total = total
+        self.generation = daemon.generation  # of the daemon's index the rows are from
+        self.on_missing = on_missing  # asked to fetch a page row() does not have, see add_page()
+        self.pages: OrderedDict[int, list] = OrderedDict()
+        self.requested: set[int] = set()
+
+    def __len__(self) -> int:
+        return self.total
+
+    def fetch(self, page: int) -> list:
+        """The rows of a page, from the daemon. Blocks, for a thread."""
+        with perf.Span("fetch", DAEMON_PAGE):
+            return self.daemon.request("rows", **self.view, offset=page * DAEMON_PAGE, limit=DAEMON_PAGE)["rows"]
+
+    def add_page(self, page: int, rows: list) -> None:
+        self.requested.discard(page)
+        self.pages[page] = rows
+        self.pages.move_to_end(page)
+        if len(self.pages) > DAEMON_PAGES:
+            self.pages.popitem(last=False)
+
+    def row(self, position: int) -> list | None:
+        """
+        [index, line, profile, start, duration, command, flags] of a row,
+        None until its page is fetched: on_missing is asked to fetch it.
+        """
+        page, offset = divmod(position, DAEMON_PAGE)
+        rows = self.pages.get(page)
+        if rows is None:
+            if page not in self.requested and self.on_missing is not None:
+                self.requested.add(page)
+                self.on_missing(self, page)
+            return None
+        self.pages.move_to_end(page)
+        return rows[offset] if offset < len(rows) else None
+
+    def __getitem__(self, position: int) -> int:
+        """The entry index of a row. Fetches its page if needed, which blocks: for a thread."""
+        page, offset = divmod(position, DAEMON_PAGE)
+        rows = self.pages.get(page)
+        if rows is None:
+            rows = self.fetch(page)
+        return rows[offset][0]
+
+
+class DaemonInspectorApp(JsonlInspectorApp):
+    """
+    The viewer attached to an index daemon (--daemon): the daemon holds the
+    columns and computes the views, the table fetches the rows it shows.
+    Repeats are not collapsed and there are no statistics in this mode.
+    """
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        super().__init__(args)
+        self.socket_path = args.socket
+
+    def on_mount(self):
+        self.daemon = None  # DaemonClient, once attached
+        self.daemon_ready = False
+        super().on_mount()
+        self.collapse_checkbox.disabled = True
+
+    @work(exclusive=True, group="open")
+    async def open_logs(self) -> None:
+        """Attach to the daemon of the logs once the first frame is drawn, starting one if none serves them."""
+        from logdaemon import DaemonError, connect  # only needed with --daemon
+        options = ["--workers", str(self.parse_workers)]
+        if not self.use_cache:
+            options.append("--no-cache")
+        if self.search_stdout:
+            options.append("--search-stdout")
+        options += ["--settings", os.path.abspath(self.settings_path)]  # the daemon classifies the entries
+        self.load_status.update("Attaching to the index daemon")
+        self.load_status.display = True
+
+        def attach():
+            daemon = connect(self.log_sources, self.socket_path, rules=self.classifier.fingerprint, options=options)
+            return daemon, daemon.request("info")
+
+        try:
+            daemon, info = await asyncio.to_thread(attach)
+        except (DaemonError, OSError) as e:
+            self.exit(message=f"Cannot attach to the index daemon: {e}")
+            return
+        self.search_stdout = info["search_stdout"]  # the daemon's index decides
+        self.daemon = daemon
+        self.load_entries()
+
+    def on_virtual_table_row_highlighted(self, event: VirtualTable.RowHighlighted) -> None:
+        event.prevent_default()  # not the handler of JsonlInspectorApp, the rows are not local
+        if event.table is self.table and self.details.is_attached and self.daemon is not None:
+            self.fetch_details(event.cursor_row)
+
+    @work(exclusive=True, group="details")
+    async def fetch_details(self, row: int) -> None:
+        """Show the entry of a row, asked from the daemon in a thread."""
+        from logdaemon import DaemonError
+        rows = self.table_rows
+        if not 0 <= row < len(rows):
+            return
+        try:
+            with perf.Span("details", 1):
+                entry = await asyncio.to_thread(lambda: self.daemon.read(rows[row]))
+        except DaemonError as e:
+            self.details.text = f"Cannot read the entry: {e}"
+            return
+        self.show_details(entry)
+
+    def view(self) -> dict:
+        """The view of the daemon the table shows: the search, filters and sort order."""
+        after, before = self.time_window or (-INF, INF)
+        return {
+            "query": self.search_query.text,
+            "issues_only": self.show_issues_only_checkbox.value,
+            "after": after if after > -INF else None,
+            "before": before if before < INF else None,
+            "sort": self.sort_column,
+            "reverse": self.reverse_sort if self.sort_column is not None else False,
+        }
+
+    @work(exclusive=True, group="view")
+    async def show_view(self) -> None:
+        """Show the current view, the cursor staying on its entry if it is still shown."""
+        await self.fetch_view()
+
+    async def fetch_view(self) -> None:
+        """
+        Ask the daemon for the size of the current view and the position of
+        the cursor's entry in it, in a thread, and show it. The table asks
+        for the rows it draws, see fetch_page().
+        """
+        from logdaemon import DaemonError
+        if self.daemon is None or not self.daemon_ready:
+            return
+        view, shown, cursor = self.view(), self.table_rows, self.table.cursor_row
+
+        def ask() -> tuple[int, int]:
+            position = cursor
+            if 0 <= cursor < len(shown):
+                position = self.daemon.request("locate", **view, index=shown[cursor])["position"]
+            return position, self.daemon.request("rows", **view, limit=0)["total"]
+
+        try:
+            cursor, total = await asyncio.to_thread(ask)
+        except DaemonError as e:
+            self.search_input.border_subtitle = Content(str(e))  # not markup
+            self.search_input.set_class(True, "-invalid")
+            return
+        if view != self.view():
+            return  # changed while the daemon was asked, show_view() is on it
+        rows = RemoteRows(self.daemon, view, total, self.fetch_page)
+        self.filtered_rows = self.table_rows = rows
+        widths = [len(str(len(rows))), 8, 5, 19, 9, 80]  # "#", line, spock, start_time, duration, command
+        self.table.set_columns(self.sorted_column_headers, widths)
+        self.table.set_row_count(len(rows), cursor_row=cursor)
+
+    @work(group="pages")
+    async def fetch_page(self, rows: RemoteRows, page: int) -> None:
+        """Fetch a page of rows the table is about to draw, in a thread, and draw them."""
+        from logdaemon import DaemonError
+        try:
+            rows.add_page(page, await asyncio.to_thread(rows.fetch, page))
+        except DaemonError as e:
+            self.notify(f"Cannot fetch rows from the index daemon: {e}", severity="error")
+            return
+        if rows is self.table_rows:
+            start = page * DAEMON_PAGE
+            self.table.refresh_rows(range(start, min(start + DAEMON_PAGE, len(rows))))
+            if self.daemon.generation != rows.generation:
+                self.show_view()  # indexed again since
+
+    @work(exclusive=True, group="load")
+    async def load_entries(self) -> None:
+        """Show the view once the daemon has indexed the logs; in follow mode, the entries it appends."""
+        if self.daemon is None:
+            return
+        self.load_status.display = True
+        while (await asyncio.to_thread(self.daemon.request, "info"))["loading"]:
+            self.load_status.update("Waiting for the index daemon to index the logs")
+            await asyncio.sleep(DAEMON_POLL)
+        self.load_status.display = False
+        self.daemon_ready = True
+        await self.fetch_view()
+        self.table.move_cursor(self.table.row_count - 1)  # newest entry
+        if self.jump_pending is not None:
+            self.move_to_time(self.jump_pending)
+            self.jump_pending = None
+        seen = (self.daemon.count, self.daemon.generation)
+        while self.follow:
+            await asyncio.sleep(FOLLOW_INTERVAL)
+            await asyncio.to_thread(self.daemon.request, "info")
+            if (self.daemon.count, self.daemon.generation) != seen:
+                seen = (self.daemon.count, self.daemon.generation)
+                at_bottom = self.table.cursor_row >= self.table.row_count - 1
+                await self.fetch_view()
+                if at_bottom:
+                    self.table.move_cursor(self.table.row_count - 1)
+
+    async def save_index_cache(self) -> None:
+        pass  # the daemon's
+
+    async def on_unmount(self) -> None:
+        if self.daemon is not None:
+            self.daemon.close()
+
+    @work(exclusive=True, group="search")
+    async def search(self, query: Query) -> None:
+        self.search_query = query
+        self.apply_filters()
+
+    def apply_filters(self) -> None:
+        self.view_query = self.view_filter()
+        self.show_view()
+
+    def sort_rows(self, rows):
+        return rows  # sorted by the daemon
+
+    def build_table(self, rows=None) -> None:
+        self.show_view()
+
+    def render_row(self, position: int) -> list:
+        row = self.table_rows.row(position)
+        if row is None:  # drawn again when fetch_page() has it
+            return self.row_cells(position, -1, "", NAN, NAN, "…", 0)
+        index, line, profile, start, duration, command, flags = row
+        return self.row_cells(position, line, profile, NAN if start is None else start,
+                              NAN if duration is None else duration, command, flags)
+
+    def restyle(self, flag: int) -> None:
+        self.table.refresh_rows()  # the flags come with the rows
+
+    def jump_to_time(self, t: float | None) -> None:
+        if t is None:
+            return
+        if self.daemon_ready:
+            self.move_to_time(t)
+        else:
+            self.jump_pending = t  # moved to by load_entries
+
+    def move_to_time(self, t: float) -> None:
+        if self.daemon is not None and len(self.table_rows):
+            self.locate_time(t)
+
+    @work(exclusive=True, group="locate")
+    async def locate_time(self, t: float) -> None:
+        from logdaemon import DaemonError
+        try:
+            response = await asyncio.to_thread(self.daemon.request, "locate", **self.view(), time=t)
+        except DaemonError as e:
+            self.notify(f"Cannot locate {format_time(t)}: {e}", severity="error")
+            return
+        self.table.move_cursor(response["position"])
+
+    def action_toggle_collapse(self) -> None:
+        self.notify("Repeats are not collapsed with --daemon")
+
+    def action_show_stats(self) -> None:
+        self.notify("No statistics with --daemon")
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parser.parse_args(argv)
+    for option in ("at", "before", "after"):
+        value = getattr(args, option)
+        if value and parse_time(value) != parse_time(value):  # NaN
+            parser.error(f"--{option} {value}: not an ISO timestamp")
+    logging.basicConfig(
+        handlers=[logging.FileHandler("app.log", delay=True)],  # the file is only created when something is logged
+        level=logging.DEBUG if args.debug else logging.WARNING,
+        format="%(asctime)s %(levelname)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    if args.socket and not args.daemon:
+        parser.error("--socket is the socket of the daemon, it needs --daemon")
+    try:
+        app = DaemonInspectorApp(args) if args.daemon else JsonlInspectorApp(args)
+    except ValueError as e:  # of the settings file: not JSON, or a highlight rule that is not valid
+        parser.error(f"{args.settings}: {e}")
+    if args.trace:
+        perf.start_trace()
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.runcall(app.run)
+        profiler.dump_stats(args.profile)
+    else:
+        app.run()
+    if args.trace:
+        perf.write_trace(args.trace)
+
+
 if __name__ == "__main__":
-    import os
-    JsonlInspectorApp().run()
+    main()
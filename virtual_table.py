@@ -0,0 +1,267 @@
+"""
+A row-cursor table widget that renders its rows on demand.
+
+Unlike DataTable it does not own any row data: it only knows how many rows
+there are and asks a callback for the cells of a row when that row scrolls
+into view. Changing the rows (filter, sort) is a matter of changing the row
+count and dropping the few cached rows, however long the table is.
+"""
+from typing import Callable, Iterable, Sequence
+
+from rich.console import RenderableType
+from rich.text import Text
+from textual import events
+from textual.binding import Binding
+from textual.geometry import Size
+from textual.message import Message
+from textual.reactive import reactive
+from textual.scroll_view import ScrollView
+from textual.strip import Strip
+
+import perf
+
+ROW_BUFFER = 20  # rows kept materialized above and below the viewport
+CELL_PADDING = 1
+
+
+class VirtualTable(ScrollView, can_focus=True):
+    BINDINGS = [
+        Binding("up", "cursor_up", "Cursor up", show=False),
+        Binding("down", "cursor_down", "Cursor down", show=False),
+        Binding("pageup", "page_up", "Page up", show=False),
+        Binding("pagedown", "page_down", "Page down", show=False),
+        Binding("home,ctrl+home", "cursor_top", "Top", show=False),
+        Binding("end,ctrl+end", "cursor_bottom", "Bottom", show=False),
+    ]
+
+    COMPONENT_CLASSES = {
+        "virtual-table--header",
+        "virtual-table--cursor",
+        "virtual-table--even-row",
+    }
+
+    DEFAULT_CSS = """
+    VirtualTable {
+        background: $surface;
+        color: $foreground;
+        &:focus > .virtual-table--cursor {
+            background: $block-cursor-background;
+            color: $block-cursor-foreground;
+            text-style: $block-cursor-text-style;
+        }
+        & > .virtual-table--header {
+            text-style: bold;
+            background: $panel;
+            color: $foreground;
+        }
+        & > .virtual-table--even-row {
+            background: $surface-lighten-1 50%;
+        }
+        & > .virtual-table--cursor {
+            background: $block-cursor-blurred-background;
+            color: $block-cursor-blurred-foreground;
+            text-style: $block-cursor-blurred-text-style;
+        }
+    }
+    """
+
+    cursor_row = reactive(0)
+
+    class RowHighlighted(Message):
+        def __init__(self, table: "VirtualTable", cursor_row: int) -> None:
+            super().__init__()
+            self.table = table
+            self.cursor_row = cursor_row
+
+        @property
+        def control(self) -> "VirtualTable":
+            return self.table
+
+    class HeaderSelected(Message):
+        def __init__(self, table: "VirtualTable", column_index: int, label: str) -> None:
+            super().__init__()
+            self.table = table
+            self.column_index = column_index
+            self.label = label
+
+        @property
+        def control(self) -> "VirtualTable":
+            return self.table
+
+    class Scrolled(Message):
+        """The table scrolled vertically by at least a row."""
+        def __init__(self, table: "VirtualTable") -> None:
+            super().__init__()
+            self.table = table
+
+        @property
+        def control(self) -> "VirtualTable":
+            return self.table
+
+    def __init__(self,
+                 get_row: Callable[[int], Sequence[RenderableType]],
+                 *,
+                 zebra_stripes: bool = False,
+                 name: str | None = None,
+                 id: str | None = None,
+                 classes: str | None = None,
+                 ) -> None:
+        super().__init__(name=name, id=id, classes=classes)
+        self.get_row = get_row
+        self.zebra_stripes = zebra_stripes
+        self.column_labels: list[str] = []
+        self.column_widths: list[int] = []
+        self._row_count = 0
+        self._rows: dict[int, Strip] = {}  # materialized rows, by position
+        self.rows_built = 0  # rows materialized from get_row so far
+
+    @property
+    def row_count(self) -> int:
+        return self._row_count
+
+    def set_columns(self, labels: list[str], widths: list[int]) -> None:
+        self.column_labels = list(labels)
+        self.column_widths = [max(w, len(label)) for label, w in zip(labels, widths)]
+        self._update_virtual_size()
+
+    def set_row_count(self, count: int, cursor_row: int | None = None) -> None:
+        """
+        Change the number of rows and re-render. The cursor stays where it is
+        (or moves to cursor_row), clamped to the new row count.
+        """
+        self._row_count = count
+        self._rows.clear()
+        row = self.cursor_row if cursor_row is None else cursor_row
+        self.set_reactive(VirtualTable.cursor_row, max(0, min(row, count - 1)))
+        self._update_virtual_size()
+        self.refresh()
+        if count:
+            self._scroll_cursor_into_view()
+            # a grown table can only scroll that far once it is laid out again
+            self.call_after_refresh(self._scroll_cursor_into_view)
+            self.post_message(self.RowHighlighted(self, self.cursor_row))
+
+    @property
+    def rendered_rows(self) -> list[int]:
+        """Positions of the materialized rows, those in and around the view."""
+        return list(self._rows)
+
+    def refresh_rows(self, rows: Iterable[int] | None = None) -> None:
+        """Drop the materialized rows (all, or those at the given positions) so they are rebuilt from get_row."""
+        if rows is None:
+            self._rows.clear()
+        else:
+            for row in rows:
+                self._rows.pop(row, None)
+        self.refresh()
+
+    def move_cursor(self, row: int) -> None:
+        self.cursor_row = max(0, min(row, self._row_count - 1))
+
+    def _update_virtual_size(self) -> None:
+        width = sum(w + 2 * CELL_PADDING for w in self.column_widths)
+        self.virtual_size = Size(width, self._row_count + 1)  # +1 for the header
+
+    def _scroll_cursor_into_view(self) -> None:
+        top = int(self.scroll_y)
+        visible = max(self.scrollable_content_region.height - 1, 1)
+        if self.cursor_row < top:
+            self.scroll_to(y=self.cursor_row, animate=False, immediate=True)
+        elif self.cursor_row >= top + visible:
+            self.scroll_to(y=self.cursor_row - visible + 1, animate=False, immediate=True)
+
+    def on_resize(self, event: events.Resize) -> None:
+        # the cursor may have been placed before the table had a size
+        self._scroll_cursor_into_view()
+
+    def watch_scroll_y(self, old_value: float, new_value: float) -> None:
+        super().watch_scroll_y(old_value, new_value)
+        if round(old_value) != round(new_value):
+            self.post_message(self.Scrolled(self))
+
+    def watch_cursor_row(self, old_row: int, new_row: int) -> None:
+        self.refresh()
+        self._scroll_cursor_into_view()
+        if self._row_count:
+            self.post_message(self.RowHighlighted(self, new_row))
+
+    def _render_cells(self, cells: Sequence[RenderableType]) -> Strip:
+        line = Text(no_wrap=True, end="")
+        for cell, width in zip(cells, self.column_widths):
+            text = cell.copy() if isinstance(cell, Text) else Text(str(cell))
+            text.truncate(width, overflow="ellipsis", pad=True)
+            line.append(" " * CELL_PADDING)
+            line.append_text(text)
+            line.append(" " * CELL_PADDING)
+        return Strip(line.render(self.app.console))
+
+    def _get_row_strip(self, row: int) -> Strip:
+        strip = self._rows.get(row)
+        if strip is None:
+            strip = self._rows[row] = self._render_cells(self.get_row(row))
+            self.rows_built += 1
+        return strip
+
+    def render_lines(self, crop):
+        # forget rows that scrolled well out of view
+        top = int(self.scroll_y)
+        low, high = top - ROW_BUFFER, top + self.size.height + ROW_BUFFER
+        for row in [r for r in self._rows if not low <= r <= high]:
+            del self._rows[row]
+        with perf.Span("render") as span:
+            built = self.rows_built
+            lines = super().render_lines(crop)
+            span.rows = self.rows_built - built
+        return lines
+
+    def render_line(self, y: int) -> Strip:
+        width = self.size.width
+        scroll_x = int(self.scroll_x)
+        base_style = self.rich_style
+        if y == 0:
+            strip = self._render_cells(self.column_labels)
+            style = self.get_component_rich_style("virtual-table--header")
+            return strip.apply_style(base_style + style).crop_extend(scroll_x, scroll_x + width, base_style + style)
+        row = int(self.scroll_y) + y - 1
+        if row >= self._row_count:
+            return Strip.blank(width, base_style)
+        style = base_style
+        if self.zebra_stripes and row % 2 == 0:
+            style += self.get_component_rich_style("virtual-table--even-row")
+        if row == self.cursor_row:
+            style += self.get_component_rich_style("virtual-table--cursor")
+        return self._get_row_strip(row).apply_style(style).crop_extend(scroll_x, scroll_x + width, style)
+
+    def on_click(self, event: events.Click) -> None:
+        offset = event.get_content_offset(self)
+        if offset is None:
+            return
+        if offset.y == 0:
+            x = offset.x + int(self.scroll_x)
+            for index, (label, width) in enumerate(zip(self.column_labels, self.column_widths)):
+                x -= width + 2 * CELL_PADDING
+                if x < 0:
+                    self.post_message(self.HeaderSelected(self, index, label))
+                    break
+            return
+        row = int(self.scroll_y) + offset.y - 1
+        if row < self._row_count:
+            self.cursor_row = row
+
+    def action_cursor_up(self) -> None:
+        self.move_cursor(self.cursor_row - 1)
+
+    def action_cursor_down(self) -> None:
+        self.move_cursor(self.cursor_row + 1)
+
+    def action_page_up(self) -> None:
+        self.move_cursor(self.cursor_row - (self.scrollable_content_region.height - 1))
+
+    def action_page_down(self) -> None:
+        self.move_cursor(self.cursor_row + (self.scrollable_content_region.height - 1))
+
+    def action_cursor_top(self) -> None:
+        self.move_cursor(0)
+
+    def action_cursor_bottom(self) -> None:
+        self.move_cursor(self._row_count - 1)